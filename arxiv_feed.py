@@ -0,0 +1,112 @@
+import io
+import re
+import time
+from xml.etree import ElementTree
+from metrics import observe
+
+ATOM = "{http://www.w3.org/2005/Atom}"
+ARXIV = "{http://arxiv.org/schemas/atom}"
+
+ENTRY = ATOM + "entry"
+ID = ATOM + "id"
+TITLE = ATOM + "title"
+SUMMARY = ATOM + "summary"
+PUBLISHED = ATOM + "published"
+UPDATED = ATOM + "updated"
+AUTHOR = ATOM + "author"
+NAME = ATOM + "name"
+LINK = ATOM + "link"
+CATEGORY = ATOM + "category"
+DOI = ARXIV + "doi"
+PRIMARY_CATEGORY = ARXIV + "primary_category"
+
+VERSION_RE = re.compile(r"v(\d+)$")
+
+def entry_record(entry):
+    # One pass over the entry's children instead of a find() per field
+    paper = {
+        "id": None,
+        "title": None,
+        "summary": None,
+        "pdf_url": None,
+        "published_date": None,
+        "updated_date": None,
+        "authors": [],
+        "categories": [],
+        "primary_category": None,
+        "doi": None,
+        "version": None,
+    }
+    for child in entry:
+        tag = child.tag
+        if tag == AUTHOR:
+            name = child.find(NAME)
+            if name is not None:
+                paper["authors"].append(name.text)
+        elif tag == CATEGORY:
+            paper["categories"].append(child.get("term"))
+        elif tag == LINK:
+            if child.get("title") == "pdf":
+                paper["pdf_url"] = child.get("href")
+        elif tag == ID:
+            # http://arxiv.org/abs/2101.00001v2 or http://arxiv.org/abs/hep-th/9901001v1
+            paper["id"] = child.text.split("/abs/")[-1]
+            version = VERSION_RE.search(paper["id"])
+            paper["version"] = int(version.group(1)) if version else None
+        elif tag == TITLE:
+            paper["title"] = child.text
+        elif tag == SUMMARY:
+            paper["summary"] = child.text
+        elif tag == PUBLISHED:
+            paper["published_date"] = child.text.split("T")[0]
+        elif tag == UPDATED:
+            paper["updated_date"] = child.text.split("T")[0]
+        elif tag == PRIMARY_CATEGORY:
+            paper["primary_category"] = child.get("term")
+        elif tag == DOI:
+            paper["doi"] = child.text
+    return paper
+
+class AtomFeedParser:
+    # Incremental parser: feed() bytes as they arrive and get back records for the entries completed so far
+    def __init__(self):
+        self.parser = ElementTree.XMLPullParser(events=("start", "end"))
+        self.root = None
+        self.seconds = 0.0  # Time spent parsing, excluding waits for the network
+
+    def feed(self, data):
+        start = time.perf_counter()
+        self.parser.feed(data)
+        records = self._records()
+        self.seconds += time.perf_counter() - start
+        return records
+
+    def close(self):
+        start = time.perf_counter()
+        self.parser.close()
+        records = self._records()
+        self.seconds += time.perf_counter() - start
+        observe('garx_operation_seconds', self.seconds, operation='parse', outcome='ok')
+        return records
+
+    def _records(self):
+        records = []
+        for event, element in self.parser.read_events():
+            if event == "start":
+                if self.root is None:
+                    self.root = element
+            elif element.tag == ENTRY:
+                records.append(entry_record(element))
+                # Drop the parsed entry so memory stays flat however long the feed is
+                self.root.remove(element)
+        return records
+
+def iter_arxiv_entries(source, chunk_size=64 * 1024):
+    # source: bytes, a binary file-like object or an iterable of byte chunks
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+    chunks = iter(lambda: source.read(chunk_size), b"") if hasattr(source, "read") else source
+    parser = AtomFeedParser()
+    for chunk in chunks:
+        yield from parser.feed(chunk)
+    yield from parser.close()
@@ -1,69 +1,274 @@
 import requests
-import time
 import os
-from xml.etree import ElementTree
-import configparser
-import google.generativeai as genai
-import traceback
+import re
+import sys
+import json
+import time
+from urllib.parse import urlencode
+from xml.etree.ElementTree import ParseError
 import logging
-from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from concurrent.futures import ThreadPoolExecutor, TimeoutError, as_completed
+import sqlite3
 import subprocess
+import http_client
+import metrics
+from arxiv_feed import iter_arxiv_entries
+from cache import get_cache, make_key
+from chat_session import POLITICS_PROMPT, REVIEWER_PROMPT, ChatSession
+from library import get_library
+from llm_backends import BackendError, task_model, task_routes
+from paper_index import PaperIndex, extract_pdf_text, index_text
+from paper_store import download_paper, download_papers, paper_dir, paper_path
+from scheduler import BATCH, INTERACTIVE, RequestCancelled, get_scheduler
+from settings import get_setting
+from token_budget import context_window, count_message_tokens, count_tokens, fit_messages, split_by_tokens
 
-# Configure logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+# arXiv only treats these as operators in uppercase; "and" is just another search term
+BOOLEAN_OPERATORS = ("AND", "OR", "ANDNOT")
 
-# Load API keys and settings
-config = configparser.ConfigParser()
-with open('key.ini') as config_file:
-    config.read_file(config_file)
+def normalize_query(query):
+    # Case-insensitive form of a query for cache keys; terms are lowercased but operators kept
+    return " ".join(word if word in BOOLEAN_OPERATORS else word.lower() for word in query.split())
 
-def fetch_arxiv_papers(query, max_results=5, retries=3):
-    base_url = "http://export.arxiv.org/api/query?"
-    search_query = f"search_query=all:{query}&start=0&max_results={max_results}"
+SORT_FIELDS = ("relevance", "lastUpdatedDate", "submittedDate")
+SORT_ORDERS = ("ascending", "descending")
 
-    for attempt in range(retries):
-        try:
-            response = requests.get(base_url + search_query)
+def arxiv_date(value, end_of_day=False):
+    # Accepts date/datetime objects or "YYYY-MM-DD" strings; arXiv wants YYYYMMDDHHMM
+    if hasattr(value, 'strftime'):
+        value = value.strftime("%Y-%m-%d")
+    return value.replace("-", "")[:8] + ("2359" if end_of_day else "0000")
+
+def search_filters(sort_by=None, sort_order=None, date_from=None, date_to=None):
+    # Normalized non-empty search options, also used as part of the cache key
+    if sort_by is not None and sort_by not in SORT_FIELDS:
+        raise ValueError(f"sort_by must be one of {SORT_FIELDS}")
+    if sort_order is not None and sort_order not in SORT_ORDERS:
+        raise ValueError(f"sort_order must be one of {SORT_ORDERS}")
+    filters = {
+        "sort_by": sort_by,
+        "sort_order": sort_order,
+        "date_from": arxiv_date(date_from) if date_from else None,
+        "date_to": arxiv_date(date_to, end_of_day=True) if date_to else None,
+    }
+    return {key: value for key, value in filters.items() if value is not None}
+
+ARXIV_API_URL = "http://export.arxiv.org/api/query?"
+# New-style (2101.00001v2) and old-style (hep-th/9901001v1) identifiers
+ARXIV_ID_RE = re.compile(r"^(\d{4}\.\d{4,5}|[a-z-]+(\.[A-Z]{2})?/\d{7})(v\d+)?$")
+
+def is_arxiv_id(text):
+    return bool(ARXIV_ID_RE.match(text.strip()))
+
+def arxiv_api_url():
+    # [arXiv] API_URL can point at a mirror or the benchmark mock server
+    return get_setting('arXiv', 'API_URL', ARXIV_API_URL)
+
+def arxiv_query_url(query, start=0, max_results=5, **filters):
+    base_url = arxiv_api_url()
+    filters = search_filters(**filters)
+    # Sent with the user's casing, which decides what arXiv reads as an operator
+    search_query = f"all:{' '.join(query.split())}"
+    if "date_from" in filters or "date_to" in filters:
+        date_range = f"[{filters.get('date_from', '000001010000')} TO {filters.get('date_to', '999912312359')}]"
+        search_query = f"({search_query}) AND submittedDate:{date_range}"
+    params = {"search_query": search_query, "start": start, "max_results": max_results}
+    if "sort_by" in filters:
+        params["sortBy"] = filters["sort_by"]
+    if "sort_order" in filters:
+        params["sortOrder"] = filters["sort_order"]
+    return base_url + urlencode(params)
+
+def lookup_search_cache(query, start, max_results, use_cache=True, **filters):
+    # Returns (cache, key, entry); entry may be stale and is None on a miss
+    if not use_cache:
+        return None, None, None
+    cache = get_cache('search')
+    cache_key = make_key(normalize_query(query), start, max_results, search_filters(**filters))
+    return cache, cache_key, cache.get(cache_key)
+
+def conditional_headers(entry):
+    # Stale entries are revalidated with a conditional request
+    headers = {}
+    if entry is not None:
+        if entry.etag:
+            headers['If-None-Match'] = entry.etag
+        if entry.last_modified:
+            headers['If-Modified-Since'] = entry.last_modified
+    return headers
+
+def record_papers(papers):
+    # Every paper seen goes into the local library; a library failure never breaks a search
+    try:
+        get_library().add_papers(papers)
+    except sqlite3.Error as e:
+        logging.error(f"Error recording papers in library: {e}")
+
+def record_summary(paper_id, summary):
+    if not summary or summary.startswith("Error"):
+        return
+    try:
+        get_library().add_summary(paper_id, summary)
+    except sqlite3.Error as e:
+        logging.error(f"Error recording summary in library: {e}")
+
+def record_chat(paper_id, question, answer):
+    if not answer or answer.startswith("Error"):
+        return
+    try:
+        library = get_library()
+        library.add_chat_message(paper_id, "user", question)
+        library.add_chat_message(paper_id, "assistant", answer)
+    except sqlite3.Error as e:
+        logging.error(f"Error recording chat in library: {e}")
+
+def record_chat_summary(session):
+    try:
+        get_library().set_chat_summary(session.paper_id, session.summary, session.compressed)
+    except sqlite3.Error as e:
+        logging.error(f"Error recording chat summary in library: {e}")
+
+def load_chat_session(paper, paper_index=None):
+    # Continues the paper's earlier chat from the library, starting from its stored running summary
+    try:
+        library = get_library()
+        transcript = library.chat_transcript(paper['id'])
+        summary, compressed = library.chat_summary(paper['id'])
+    except sqlite3.Error as e:
+        logging.error(f"Error loading chat from library: {e}")
+        transcript, summary, compressed = [], None, 0
+    compressed = min(compressed, len(transcript))
+    return ChatSession(paper['id'], paper['summary'], paper_index=paper_index, history=transcript[compressed:],
+                       summary=summary, compressed=compressed), transcript
+
+def fetch_arxiv_papers(query, max_results=5, start=0, use_cache=True, **filters):
+    # filters: sort_by, sort_order, date_from, date_to (see search_filters)
+    with metrics.timed('search') as timer:
+        papers = _fetch_arxiv_papers(query, max_results, start, use_cache, **filters)
+        if papers is None:
+            timer.outcome = 'error'
+    return papers
+
+def _fetch_arxiv_papers(query, max_results, start, use_cache, **filters):
+    cache, cache_key, entry = lookup_search_cache(query, start, max_results, use_cache, **filters)
+    if entry is not None and cache.is_fresh(entry):
+        logging.info("Search cache hit")
+        return entry.value
+
+    # Retries with backoff on 429/5xx are handled by the shared session
+    try:
+        url = arxiv_query_url(query, start, max_results, **filters)
+        with http_client.get(url, headers=conditional_headers(entry), stream=True) as response:
+            if entry is not None and response.status_code == 304:
+                cache.refresh(cache_key)
+                return entry.value
             response.raise_for_status()
-            return parse_arxiv_response(response.content)
-        except requests.exceptions.HTTPError as e:
-            if response.status_code == 502:
-                logging.warning("Received 502, retrying...")
-                time.sleep(2)
-            else:
-                logging.error(f"Error fetching papers: {e}")
-                break
-    return None
+            # Entries are parsed as the body streams in rather than after it is fully buffered
+            papers = list(iter_arxiv_entries(response.iter_content(64 * 1024)))
+    except (requests.exceptions.RequestException, ParseError) as e:
+        logging.error(f"Error fetching papers: {e}")
+        if entry is not None:
+            logging.warning("Serving stale search results from cache")
+            return entry.value
+        return None
 
-def parse_arxiv_response(content):
-    root = ElementTree.fromstring(content)
-    papers = []
-    for entry in root.findall("{http://www.w3.org/2005/Atom}entry"):
-        paper_id = entry.find("{http://www.w3.org/2005/Atom}id").text.split("/")[-1]
-        published_date = entry.find("{http://www.w3.org/2005/Atom}published").text.split("T")[0]
-        authors = [author.find("{http://www.w3.org/2005/Atom}name").text for author in entry.findall("{http://www.w3.org/2005/Atom}author")]
-        
-        paper = {
-            "id": paper_id,
-            "title": entry.find("{http://www.w3.org/2005/Atom}title").text,
-            "summary": entry.find("{http://www.w3.org/2005/Atom}summary").text,
-            "pdf_url": next(link.get('href') for link in entry.findall("{http://www.w3.org/2005/Atom}link") if link.get('title') == 'pdf'),
-            "published_date": published_date,
-            "authors": authors,
-        }
-        papers.append(paper)
+    # Only papers fresh from arXiv are recorded; cached results were recorded when they were fetched
+    record_papers(papers)
+    if cache is not None:
+        cache.set(cache_key, papers, etag=response.headers.get('ETag'), last_modified=response.headers.get('Last-Modified'))
     return papers
 
-def download_paper(pdf_url, paper_id):
-    response = requests.get(pdf_url)
-    if response.status_code == 200:
-        filename = f"{paper_id}.pdf"
-        with open(filename, 'wb') as f:
-            f.write(response.content)
-        return filename
-    else:
+def arxiv_id_url(paper_ids):
+    return arxiv_api_url() + urlencode({"id_list": ",".join(paper_ids), "max_results": len(paper_ids)})
+
+def fetch_papers_by_id(paper_ids):
+    # Known papers are a library lookup; only the others are fetched from arXiv. Returns {requested id: paper}
+    papers = {}
+    for paper_id in paper_ids:
+        try:
+            paper = get_library().get_paper(paper_id)
+        except sqlite3.Error as e:
+            logging.error(f"Error reading paper from library: {e}")
+            paper = None
+        if paper is not None:
+            papers[paper_id] = paper
+    missing = [paper_id for paper_id in paper_ids if paper_id not in papers]
+    if missing:
+        try:
+            with http_client.get(arxiv_id_url(missing), stream=True) as response:
+                response.raise_for_status()
+                fetched = list(iter_arxiv_entries(response.iter_content(64 * 1024)))
+        except (requests.exceptions.RequestException, ParseError) as e:
+            logging.error(f"Error fetching papers: {e}")
+            fetched = []
+        # arXiv answers unknown IDs with an entry that has no title
+        fetched = [paper for paper in fetched if paper['title']]
+        record_papers(fetched)
+        for paper_id in missing:
+            for paper in fetched:
+                if paper['id'] == paper_id or paper['id'].rsplit('v', 1)[0] == paper_id:
+                    papers[paper_id] = paper
+    return papers
+
+def iter_arxiv_pages(query, page_size=None, start=0, max_pages=None, use_cache=True, **filters):
+    # Yields one page of papers at a time, fetching the next page only when asked for it
+    page_size = page_size or get_setting('arXiv', 'MAX_RESULTS', 5, int)
+    pages = 0
+    while max_pages is None or pages < max_pages:
+        papers = fetch_arxiv_papers(query, max_results=page_size, start=start, use_cache=use_cache, **filters)
+        if not papers:
+            return
+        yield papers
+        if len(papers) < page_size:
+            return
+        start += page_size
+        pages += 1
+
+def parse_arxiv_response(content):
+    return list(iter_arxiv_entries(content))
+
+def stored_paper_text(paper):
+    try:
+        return get_library().full_text(paper['id'])
+    except sqlite3.Error as e:
+        logging.error(f"Error reading paper text from library: {e}")
         return None
 
+def extract_paper_text(filename, paper):
+    try:
+        text = extract_pdf_text(filename)
+    except Exception as e:
+        logging.error(f"Error extracting text from {filename}: {e}")
+        return None
+    try:
+        get_library().set_full_text(paper['id'], text, pdf_path=os.path.abspath(filename))
+    except sqlite3.Error as e:
+        logging.error(f"Error recording paper text in library: {e}")
+    return text
+
+def paper_text(paper):
+    # Papers opened before are read from the library without downloading or parsing the PDF
+    text = stored_paper_text(paper)
+    if text:
+        return text
+    filename = download_paper(paper['pdf_url'], paper['id'])
+    if not filename:
+        return None
+    return extract_paper_text(filename, paper)
+
+def index_paper_text(text, paper):
+    return index_text(
+        text,
+        abstract=paper.get('summary'),
+        chunk_words=get_setting('Chat', 'CHUNK_WORDS', 200, int),
+        overlap=get_setting('Chat', 'CHUNK_OVERLAP', 40, int),
+    )
+
+def index_paper(paper):
+    # Full-text index of the paper's PDF, used to pick relevant chunks for chat
+    text = paper_text(paper)
+    return index_paper_text(text, paper) if text else None
+
 def open_pdf(filename):
     if os.name == 'nt':  # For Windows
         os.startfile(filename)
@@ -71,73 +276,277 @@ def open_pdf(filename):
         opener = 'open' if sys.platform == 'darwin' else 'xdg-open'
         subprocess.call([opener, filename])
 
-def api_request(api_key, api_base, model, role, content, max_tokens=500):
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json"
-    }
-    
-    data = {
-        "model": model,
-        "messages": [
-            {"role": "system", "content": role},
-            {"role": "user", "content": content}
-        ],
-        "max_tokens": max_tokens
-    }
-    
-    try:
-        response = requests.post(f"{api_base}/chat/completions", headers=headers, json=data, timeout=30)
+SUMMARY_MAX_TOKENS = 500
+CHAT_MAX_TOKENS = 700
+TRANSLATE_MAX_TOKENS = 500
+COMPRESS_MAX_TOKENS = 300
+
+def summary_messages(text):
+    return [
+        {"role": "system", "content": "Your goal is to summarize the provided content from an academic paper. Your summary should be concise and focus on the key information of the academic paper, do not miss any important point."},
+        {"role": "user", "content": f"Please summarize the following scientific paper:\n\n{text}"}
+    ]
+
+def chat_messages(paper_content, question):
+    # With a full-text index only the top-k chunks for this question are sent
+    if isinstance(paper_content, PaperIndex):
+        paper_content = paper_content.context(question, get_setting('Chat', 'TOP_K_CHUNKS', 4, int))
+
+    return [
+        {"role": "system", "content": REVIEWER_PROMPT},
+        {"role": "system", "content": POLITICS_PROMPT},
+        {"role": "user", "content": f"You will be asked to answer questions about the paper with deep knowledge about it, providing clear and concise explanations in a helpful, friendly manner, using the asker's language, answer this question:\n\nQuestion: {question}\n\nPaper content: {paper_content}"}
+    ]
+
+def chunk_summary_messages(text, part, parts):
+    return [
+        {"role": "system", "content": "Your goal is to summarize one part of an academic paper. Keep the key claims, methods, results and numbers of this part, do not miss any important point."},
+        {"role": "user", "content": f"Please summarize part {part} of {parts} of the following scientific paper:\n\n{text}"}
+    ]
+
+def merge_summary_messages(summaries):
+    parts = "\n\n".join(f"Part {i}:\n{summary}" for i, summary in enumerate(summaries, 1))
+    return [
+        {"role": "system", "content": "Your goal is to combine summaries of consecutive parts of one academic paper into a single summary. Your summary should be concise and focus on the key information of the academic paper, do not miss any important point."},
+        {"role": "user", "content": f"Please combine these summaries of the parts of a scientific paper into one summary:\n\n{parts}"}
+    ]
+
+def summary_chunks(text, model, max_tokens=SUMMARY_MAX_TOKENS):
+    # Returns None when the text fits in one chunk, otherwise the chunks to map over
+    overhead = count_message_tokens(chunk_summary_messages("", 1, 1))
+    chunk_tokens = max(min(get_setting('Summary', 'CHUNK_TOKENS', 3000, int), context_window(model) - overhead - max_tokens), 64)
+    if count_tokens(text) <= chunk_tokens:
+        return None
+    return split_by_tokens(text, chunk_tokens)
+
+def merge_groups(summaries, model, max_tokens=SUMMARY_MAX_TOKENS):
+    # Packs consecutive summaries into groups whose merge prompt fits the context window
+    window = context_window(model)
+    groups = [[]]
+    for summary in summaries:
+        group = groups[-1] + [summary]
+        if len(group) > 2 and count_message_tokens(merge_summary_messages(group)) + max_tokens > window:
+            groups.append([summary])
+        else:
+            groups[-1] = group
+    return groups
+
+def summary_rounds(chunks, model):
+    # The map-reduce behind summarize_long_text and its async twin. Yields (prompts, final) for each round,
+    # the chunk summaries first and then merges of summaries grouped to fit the context, and is sent back
+    # the summaries of each round; the final round is the single merge that gives the paper's summary.
+    summaries = yield [chunk_summary_messages(chunk, part, len(chunks)) for part, chunk in enumerate(chunks, 1)], False
+    while True:
+        groups = merge_groups(summaries, model)
+        if len(groups) == 1:
+            yield [merge_summary_messages(groups[0])], True
+            return
+        summaries = yield [merge_summary_messages(group) for group in groups], False
+
+def translation_messages(text, target_language):
+    return [
+        {"role": "system", "content": "You are a translation assistant."},
+        {"role": "user", "content": f"Translate the following text to {target_language}:\n\n{text}"}
+    ]
+
+def parse_completion(body):
+    return body.get('choices', [{}])[0].get('message', {}).get('content', '')
+
+def parse_stream_line(line):
+    # Server-sent events: one "data: {json}" line per chunk, terminated by "data: [DONE]".
+    # Returns the content delta, "" for lines without content and None at the end of the stream.
+    if not line.startswith(b"data:"):
+        return ""
+    payload = line[5:].strip()
+    if payload == b"[DONE]":
+        return None
+    return json.loads(payload).get('choices', [{}])[0].get('delta', {}).get('content') or ""
+
+def parse_stream_usage(line):
+    # Groq reports token usage in the last chunk under x_groq, other OpenAI-compatible servers under usage
+    if b'"usage"' not in line or not line.startswith(b"data:"):
+        return None
+    chunk = json.loads(line[5:])
+    return chunk.get('usage') or chunk.get('x_groq', {}).get('usage')
+
+def record_completion_usage(task, backend, model, messages, content, usage):
+    # Without reported usage (some local servers) the counts are estimated with the local tokenizer
+    if usage:
+        metrics.record_usage(task, backend.name, model, usage.get('prompt_tokens', 0), usage.get('completion_tokens', 0))
+    else:
+        metrics.record_usage(task, backend.name, model, count_message_tokens(messages), count_tokens(content), estimated=True)
+
+def lookup_llm_cache(model, messages, max_tokens, use_cache=True):
+    # Identical prompts are answered from the on-disk LLM response cache
+    if not use_cache:
+        return None, None, None
+    cache = get_cache('llm')
+    cache_key = make_key(model, messages, max_tokens)
+    entry = cache.get(cache_key)
+    if entry is not None and cache.is_fresh(entry):
+        logging.info("LLM response cache hit")
+        return cache, cache_key, entry.value
+    return cache, cache_key, None
+
+def request_budget(messages, max_tokens):
+    return count_message_tokens(messages) + max_tokens
+
+def backend_timeout(backend):
+    # A backend's TIMEOUT replaces the read timeout, so a stalled primary fails over sooner
+    connect, read = http_client.default_timeout()
+    return (connect, backend.timeout or read)
+
+def stream_chat_completion(backend, model, messages, max_tokens=500, usage=None, retries=True):
+    # usage, if given, is filled with the token counts reported at the end of the stream
+    data = backend.payload(model, messages, max_tokens, stream=True)
+    with http_client.post(backend.url, retries, headers=backend.headers(), json=data, stream=True,
+                          timeout=backend_timeout(backend)) as response:
         response.raise_for_status()
-        return response.json().get('choices', [{}])[0].get('message', {}).get('content', '')
-    except requests.exceptions.RequestException as e:
+        for line in response.iter_lines():
+            if usage is not None:
+                usage.update(parse_stream_usage(line) or {})
+            delta = parse_stream_line(line)
+            # Read through "[DONE]" to the end so the connection can be reused
+            if delta:
+                yield delta
+
+API_ERRORS = (requests.exceptions.RequestException, RequestCancelled, BackendError)
+
+def backend_completion(backend, model, messages, max_tokens=500, use_cache=True, on_token=None,
+                       priority=INTERACTIVE, group=None, task=None, retries=True):
+    # priority orders this call against other queued calls to the backend; group lets it be cancelled (e.g. per paper).
+    # Without retries a timeout or 429 is raised at once, for a caller that has a fallback.
+    labels = {'task': task, 'backend': backend.name, 'model': model}
+    messages, max_tokens = fit_messages(messages, model, max_tokens)
+    cache, cache_key, cached = lookup_llm_cache(model, messages, max_tokens, use_cache)
+    if cached is not None:
+        metrics.inc('garx_llm_requests_total', result='cached', **labels)
+        if on_token is not None:
+            on_token(cached)
+        return cached
+
+    scheduler = get_scheduler(backend.name)
+
+    def request():
+        # Stay within the backend's requests/tokens per minute budget shared by all callers
+        waited = scheduler.acquire(request_budget(messages, max_tokens), priority, group)
+        if waited >= 0.1:
+            logging.info(f"Waited {waited:.1f}s for {backend.name} rate limit")
+
+        metrics.inc('garx_llm_requests_total', result='sent', **labels)
+        with metrics.Timer('garx_llm_request_seconds', labels):
+            if on_token is not None:
+                # Stream tokens to the caller as they arrive and return the full text at the end
+                chunks = []
+                usage = {}
+                start = time.perf_counter()
+                for delta in stream_chat_completion(backend, model, messages, max_tokens, usage, retries):
+                    if not chunks:
+                        metrics.observe('garx_llm_first_token_seconds', time.perf_counter() - start, **labels)
+                    chunks.append(delta)
+                    on_token(delta)
+                content = "".join(chunks)
+            else:
+                data = backend.payload(model, messages, max_tokens)
+                response = http_client.post(backend.url, retries, headers=backend.headers(), json=data,
+                                            timeout=backend_timeout(backend))
+                response.raise_for_status()
+                body = response.json()
+                content, usage = parse_completion(body), body.get('usage')
+        record_completion_usage(task, backend, model, messages, content, usage)
+        return content
+
+    content, coalesced = scheduler.run(cache_key or make_key(model, messages, max_tokens), request)
+    if coalesced:
+        metrics.inc('garx_llm_requests_total', result='coalesced', **labels)
+        # Answered by an identical request that was already in flight
+        if on_token is not None:
+            on_token(content)
+        return content
+
+    if cache is not None and content:
+        cache.set(cache_key, content)
+    return content
+
+def chat_completion(task, messages, max_tokens=500, use_cache=True, on_token=None, priority=INTERACTIVE, group=None):
+    # Sent to the task's backend from [Routing]; when it errors or times out the fallback backends are tried.
+    # Only the last backend retries, so a backend's TIMEOUT bounds the time spent on it before falling back.
+    routes = task_routes(task)
+    for attempt, (backend, model) in enumerate(routes, 1):
+        streamed = []
+
+        def forward(token):
+            streamed.append(token)
+            on_token(token)
+
+        try:
+            return backend_completion(backend, model, messages, max_tokens, use_cache=use_cache,
+                                      on_token=forward if on_token is not None else None, priority=priority, group=group,
+                                      task=task, retries=attempt == len(routes))
+        except requests.exceptions.RequestException as e:
+            # A partly streamed answer can't be continued by another model
+            if attempt == len(routes) or streamed:
+                raise
+            logging.warning(f"{backend.name} failed for {task}: {e}; falling back to {routes[attempt][0].name}")
+
+def api_request(task, role, content, max_tokens=500, use_cache=True, on_token=None, priority=INTERACTIVE, group=None):
+    messages = [
+        {"role": "system", "content": role},
+        {"role": "user", "content": content}
+    ]
+
+    try:
+        return chat_completion(task, messages, max_tokens, use_cache=use_cache, on_token=on_token,
+                               priority=priority, group=group)
+    except API_ERRORS as e:
         logging.error(f"Error in API request: {str(e)}")
         return f"Error in API request: {str(e)}"
 
-def summarize_with_groq(text):
-    api_key = config['Groq']['API_KEY']
-    api_base = config['Groq']['API_BASE']
-    model = config['Groq']['GROQ_MODEL']
-    return api_request(api_key, api_base, model, 
-                       "Your goal is to summarize the provided content from an academic paper. Your summary should be concise and focus on the key information of the academic paper, do not miss any important point.", 
-                       f"Please summarize the following scientific paper:\n\n{text}")
-
-def polish_with_groq(text):
-    api_key = config['Groq']['API_KEY']
-    api_base = config['Groq']['API_BASE']
-    model = config['Groq']['GROQ_MODEL']
-    return api_request(api_key, api_base, model, 
-                       "You are a helpful assistant that polishes and improves text.", 
-                       f"Please polish and improve the following text:\n\n{text}")
+def summarize_with_groq(text, use_cache=True, on_token=None, priority=INTERACTIVE, group=None):
+    messages = summary_messages(text)
+    return api_request('summary', messages[0]['content'], messages[1]['content'],
+                       SUMMARY_MAX_TOKENS, use_cache=use_cache, on_token=on_token, priority=priority, group=group)
 
-def talk_to_paper_with_groq(paper_content, question):
-    api_key = config['Groq']['API_KEY']
-    api_base = config['Groq']['API_BASE']
-    model = config['Groq']['GROQ_MODEL']  # Adjust as necessary for the chat model
+def polish_with_groq(text, use_cache=True, on_token=None):
+    return api_request('polish',
+                       "You are a helpful assistant that polishes and improves text.", 
+                       f"Please polish and improve the following text:\n\n{text}",
+                       use_cache=use_cache, on_token=on_token)
 
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json"
-    }
+def compress_chat_session(session, use_cache=True):
+    # Folds older turns into the session's running summary once its history grows past the threshold
+    request = session.compression_request()
+    if request is None:
+        return
+    messages, turns = request
+    try:
+        summary = chat_completion('compress', messages, COMPRESS_MAX_TOKENS, use_cache=use_cache, group=session.paper_id)
+    except API_ERRORS as e:
+        # The history stays uncompressed and is retried after the next turn
+        logging.warning(f"Error compressing chat history: {str(e)}")
+        return
+    if summary:
+        session.compress(summary, turns)
+        record_chat_summary(session)
+        logging.info(f"Compressed {turns} chat messages into the running summary")
 
-    data = {
-        "model": model,
-        "messages": [
-            {"role": "system", "content": "You are a professional academic paper reviewer and mentor named Garxt. As a professional academic paper reviewer and helpful mentor, you possess exceptional logical and critical thinking skills, enabling you to provide concise and insightful responses."},
-            {"role": "system", "content": "You are not allowed to discuss anything about politics, do not comment on anything about that."},
-            {"role": "user", "content": f"You will be asked to answer questions about the paper with deep knowledge about it, providing clear and concise explanations in a helpful, friendly manner, using the asker's language, answer this question:\n\nQuestion: {question}\n\nPaper content: {paper_content}"}
-        ],
-        "max_tokens": 700
-    }
+def talk_to_paper_with_groq(paper_content, question, use_cache=True, on_token=None, session=None):
+    # With a ChatSession follow-up questions keep their context; paper_content is then ignored
+    if session is not None:
+        # A long history restored from the library is condensed before it is sent
+        compress_chat_session(session, use_cache)
+    messages = session.messages(question) if session is not None else chat_messages(paper_content, question)
 
     try:
         logging.info("Sending request to Groq API for paper chat")
-        response = requests.post(f"{api_base}/chat/completions", headers=headers, json=data, timeout=30)
-        response.raise_for_status()
-        chat_response = response.json()['choices'][0]['message']['content']
+        chat_response = chat_completion('chat', messages, CHAT_MAX_TOKENS, use_cache=use_cache, on_token=on_token,
+                                        group=session.paper_id if session is not None else None)
         logging.info("Successfully received response from Groq API for paper chat")
+        if session is not None and chat_response:
+            session.add_turn(question, chat_response)
+            compress_chat_session(session, use_cache)
         return chat_response
-    except requests.exceptions.RequestException as e:
+    except API_ERRORS as e:
         logging.error(f"Error in talking to paper with Groq: {str(e)}")
         return f"Error in talking to paper with Groq: {str(e)}"
 
@@ -150,35 +559,68 @@ def run_with_timeout(func, args, timeout):
             logging.error(f"Operation timed out for function: {func.__name__}")
             return "Error: Operation timed out"
 
-def translate_with_groq(text, target_language="en"):
-    api_key = config['Groq']['API_KEY']
-    api_base = config['Groq']['API_BASE']
-    model = config['Groq']['GROQ_MODEL']  # Adjust as necessary for the translation model
-
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json"
-    }
-
-    data = {
-        "model": model,
-        "messages": [
-            {"role": "system", "content": "You are a translation assistant."},
-            {"role": "user", "content": f"Translate the following text to {target_language}:\n\n{text}"}
-        ],
-        "max_tokens": 500
-    }
+def translate_with_groq(text, target_language="en", use_cache=True, on_token=None):
+    messages = translation_messages(text, target_language)
 
     try:
         logging.info("Sending request to Groq API for translation")
-        response = requests.post(f"{api_base}/chat/completions", headers=headers, json=data, timeout=30)
-        response.raise_for_status()
-        translated_text = response.json()['choices'][0]['message']['content']
+        translated_text = chat_completion('translate', messages, TRANSLATE_MAX_TOKENS, use_cache=use_cache, on_token=on_token)
         logging.info("Successfully received translation from Groq API")
         return translated_text
-    except requests.exceptions.RequestException as e:
+    except API_ERRORS as e:
         logging.error(f"Error in translation with Groq: {str(e)}")
         return f"Error in translation with Groq: {str(e)}"
 
-def summarize_paper(text):
-    return summarize_with_groq(text)
+def summarize_paper(text, use_cache=True, on_token=None, priority=INTERACTIVE, group=None):
+    return summarize_with_groq(text, use_cache=use_cache, on_token=on_token, priority=priority, group=group)
+
+def summarize_long_text(text, use_cache=True, on_token=None, max_workers=None, priority=INTERACTIVE, group=None):
+    # Map-reduce: chunks that fit the context are summarized in parallel, then merged;
+    # only the final merge is streamed to on_token
+    try:
+        model = task_model('summary')
+    except BackendError as e:
+        logging.error(f"Error in API request: {str(e)}")
+        return f"Error in API request: {str(e)}"
+    chunks = summary_chunks(text, model)
+    if chunks is None:
+        return summarize_paper(text, use_cache=use_cache, on_token=on_token, priority=priority, group=group)
+
+    def summarize(messages):
+        return chat_completion('summary', messages, SUMMARY_MAX_TOKENS, use_cache=use_cache,
+                               priority=priority, group=group)
+
+    logging.info(f"Summarizing {len(chunks)} chunks in parallel")
+    workers = max_workers or get_setting('Batch', 'SUMMARY_WORKERS', 4, int)
+    rounds = summary_rounds(chunks, model)
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            prompts, final = next(rounds)
+            while not final:
+                prompts, final = rounds.send(list(executor.map(summarize, prompts)))
+        return chat_completion('summary', prompts[0], SUMMARY_MAX_TOKENS,
+                               use_cache=use_cache, on_token=on_token, priority=priority, group=group)
+    except API_ERRORS as e:
+        logging.error(f"Error in API request: {str(e)}")
+        return f"Error in API request: {str(e)}"
+
+def summarize_full_paper(paper, use_cache=True, on_token=None, priority=INTERACTIVE):
+    text = paper_text(paper)
+    if not text:
+        return "Error: Could not read the paper's full text"
+    return summarize_long_text(text, use_cache=use_cache, on_token=on_token, priority=priority, group=paper['id'])
+
+def summarize_papers(papers, on_result=None, max_workers=None, use_cache=True, group='batch'):
+    # Summarizes a whole result page concurrently; on_result(paper, summary) fires as each completes
+    workers = max_workers or get_setting('Batch', 'SUMMARY_WORKERS', 4, int)
+    summaries = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # Queued behind interactive requests; cancel_requests(group) drops what is still waiting
+        futures = {executor.submit(summarize_paper, paper['summary'], use_cache, priority=BATCH, group=group): paper for paper in papers}
+        for future in as_completed(futures):
+            paper = futures[future]
+            summaries[paper['id']] = future.result()
+            record_summary(paper['id'], summaries[paper['id']])
+            if on_result is not None:
+                on_result(paper, summaries[paper['id']])
+    return summaries
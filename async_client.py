@@ -0,0 +1,454 @@
+import asyncio
+import functools
+import logging
+import os
+import time
+from email.utils import parsedate_to_datetime
+from xml.etree.ElementTree import ParseError
+import aiohttp
+import metrics
+from arxiv_feed import AtomFeedParser
+from arxiv_utils import (
+    CHAT_MAX_TOKENS,
+    COMPRESS_MAX_TOKENS,
+    SUMMARY_MAX_TOKENS,
+    TRANSLATE_MAX_TOKENS,
+    arxiv_query_url,
+    chat_messages,
+    conditional_headers,
+    extract_paper_text,
+    index_paper_text,
+    lookup_llm_cache,
+    lookup_search_cache,
+    parse_completion,
+    parse_stream_line,
+    parse_stream_usage,
+    record_completion_usage,
+    record_chat_summary,
+    record_papers,
+    record_summary,
+    request_budget,
+    stored_paper_text,
+    summary_chunks,
+    summary_messages,
+    summary_rounds,
+    translation_messages,
+)
+from cache import make_key
+from http_client import RETRY_STATUSES
+from llm_backends import BackendError, task_model, task_routes
+from paper_store import CHUNK_SIZE, MAX_RESUME_ATTEMPTS, RESUME, check_part, download_target, expected_size
+from scheduler import BATCH, INTERACTIVE, RequestCancelled, get_scheduler
+from settings import get_setting
+from token_budget import fit_messages
+from watch import WatchPoll, add_found, due_watches, papers_to_summarize
+
+NETWORK_ERRORS = (aiohttp.ClientError, asyncio.TimeoutError)
+API_ERRORS = NETWORK_ERRORS + (RequestCancelled, BackendError)
+
+_session = None
+_download_locks = {}
+# .part files someone is waiting for; prefetches of these are no longer throttled
+_interactive_downloads = set()
+
+def run_blocking(func, *args, **kwargs):
+    # SQLite reads and writes, tokenizing and PDF parsing go to the default executor, off the event loop
+    return asyncio.get_running_loop().run_in_executor(None, functools.partial(func, *args, **kwargs))
+
+def get_async_session():
+    # Shared keep-alive session; must be used from the loop that created it
+    global _session
+    if _session is None or _session.closed:
+        connector = aiohttp.TCPConnector(limit_per_host=get_setting('HTTP', 'POOL_MAXSIZE', 10, int))
+        timeout = aiohttp.ClientTimeout(
+            sock_connect=get_setting('HTTP', 'CONNECT_TIMEOUT', 5, float),
+            sock_read=get_setting('HTTP', 'READ_TIMEOUT', 30, float),
+        )
+        _session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+    return _session
+
+async def close_async_session():
+    global _session
+    if _session is not None:
+        await _session.close()
+        _session = None
+
+def retry_after_delay(value):
+    if not value:
+        return None
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+async def request_with_retries(method, url, retries=True, **kwargs):
+    # Same policy as the sync session: back off on 429/5xx and honour Retry-After.
+    # retries=False sends the request once, for a caller that has a fallback.
+    max_retries = get_setting('HTTP', 'MAX_RETRIES', 3, int) if retries else 0
+    backoff_factor = get_setting('HTTP', 'BACKOFF_FACTOR', 0.5, float)
+    for attempt in range(max_retries + 1):
+        try:
+            response = await get_async_session().request(method, url, **kwargs)
+        except NETWORK_ERRORS as e:
+            if attempt == max_retries:
+                raise
+            metrics.inc('garx_http_retries_total', client='aiohttp', reason=type(e).__name__)
+            await asyncio.sleep(backoff_factor * 2 ** attempt)
+            continue
+        if response.status in RETRY_STATUSES and attempt < max_retries:
+            delay = retry_after_delay(response.headers.get('Retry-After'))
+            response.release()
+            metrics.inc('garx_http_retries_total', client='aiohttp', reason=response.status)
+            logging.warning(f"Received {response.status} from {url}, retrying")
+            await asyncio.sleep(delay if delay is not None else backoff_factor * 2 ** attempt)
+            continue
+        return response
+
+async def fetch_arxiv_papers_async(query, max_results=5, start=0, use_cache=True, **filters):
+    with metrics.timed('search') as timer:
+        papers = await _fetch_arxiv_papers_async(query, max_results, start, use_cache, **filters)
+        if papers is None:
+            timer.outcome = 'error'
+    return papers
+
+async def _fetch_arxiv_papers_async(query, max_results, start, use_cache, **filters):
+    cache, cache_key, entry = await run_blocking(lookup_search_cache, query, start, max_results, use_cache, **filters)
+    if entry is not None and cache.is_fresh(entry):
+        logging.info("Search cache hit")
+        return entry.value
+
+    try:
+        url = arxiv_query_url(query, start, max_results, **filters)
+        async with await request_with_retries('GET', url, headers=conditional_headers(entry)) as response:
+            if entry is not None and response.status == 304:
+                await run_blocking(cache.refresh, cache_key)
+                return entry.value
+            response.raise_for_status()
+            parser = AtomFeedParser()
+            papers = []
+            async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                papers.extend(parser.feed(chunk))
+            papers.extend(parser.close())
+            etag = response.headers.get('ETag')
+            last_modified = response.headers.get('Last-Modified')
+    except NETWORK_ERRORS + (ParseError,) as e:
+        logging.error(f"Error fetching papers: {e}")
+        if entry is not None:
+            logging.warning("Serving stale search results from cache")
+            return entry.value
+        return None
+
+    await run_blocking(record_papers, papers)
+    if cache is not None:
+        await run_blocking(cache.set, cache_key, papers, etag=etag, last_modified=last_modified)
+    return papers
+
+def backend_timeout_async(backend):
+    # A backend's TIMEOUT replaces the read timeout, so a stalled primary fails over sooner
+    if backend.timeout is None:
+        return {}
+    return {'timeout': aiohttp.ClientTimeout(sock_connect=get_setting('HTTP', 'CONNECT_TIMEOUT', 5, float), sock_read=backend.timeout)}
+
+async def stream_chat_completion_async(backend, model, messages, max_tokens=500, usage=None, retries=True):
+    data = backend.payload(model, messages, max_tokens, stream=True)
+    async with await request_with_retries('POST', backend.url, retries, headers=backend.headers(), json=data,
+                                          **backend_timeout_async(backend)) as response:
+        response.raise_for_status()
+        async for line in response.content:
+            line = line.strip()
+            if usage is not None:
+                usage.update(parse_stream_usage(line) or {})
+            delta = parse_stream_line(line)
+            # Read through "[DONE]" to the end so the connection can be reused
+            if delta:
+                yield delta
+
+async def backend_completion_async(backend, model, messages, max_tokens=500, use_cache=True, on_token=None,
+                                   priority=INTERACTIVE, group=None, task=None, retries=True):
+    labels = {'task': task, 'backend': backend.name, 'model': model}
+    # Counting tokens is CPU-bound and the first count may download the tokenizer, so it runs off the loop
+    messages, max_tokens = await run_blocking(fit_messages, messages, model, max_tokens)
+    cache, cache_key, cached = await run_blocking(lookup_llm_cache, model, messages, max_tokens, use_cache)
+    if cached is not None:
+        metrics.inc('garx_llm_requests_total', result='cached', **labels)
+        if on_token is not None:
+            on_token(cached)
+        return cached
+
+    scheduler = get_scheduler(backend.name)
+
+    async def request():
+        waited = await scheduler.acquire_async(await run_blocking(request_budget, messages, max_tokens), priority, group)
+        if waited >= 0.1:
+            logging.info(f"Waited {waited:.1f}s for {backend.name} rate limit")
+
+        metrics.inc('garx_llm_requests_total', result='sent', **labels)
+        with metrics.Timer('garx_llm_request_seconds', labels):
+            if on_token is not None:
+                chunks = []
+                usage = {}
+                start = time.perf_counter()
+                async for delta in stream_chat_completion_async(backend, model, messages, max_tokens, usage, retries):
+                    if not chunks:
+                        metrics.observe('garx_llm_first_token_seconds', time.perf_counter() - start, **labels)
+                    chunks.append(delta)
+                    on_token(delta)
+                content = "".join(chunks)
+            else:
+                data = backend.payload(model, messages, max_tokens)
+                async with await request_with_retries('POST', backend.url, retries, headers=backend.headers(), json=data,
+                                                      **backend_timeout_async(backend)) as response:
+                    response.raise_for_status()
+                    body = await response.json()
+                content, usage = parse_completion(body), body.get('usage')
+        await run_blocking(record_completion_usage, task, backend, model, messages, content, usage)
+        return content
+
+    content, coalesced = await scheduler.run_async(cache_key or make_key(model, messages, max_tokens), request)
+    if coalesced:
+        metrics.inc('garx_llm_requests_total', result='coalesced', **labels)
+        if on_token is not None:
+            on_token(content)
+        return content
+
+    if cache is not None and content:
+        await run_blocking(cache.set, cache_key, content)
+    return content
+
+async def chat_completion_async(task, messages, max_tokens=500, use_cache=True, on_token=None, priority=INTERACTIVE, group=None):
+    # Same routing and fallback as arxiv_utils.chat_completion
+    routes = task_routes(task)
+    for attempt, (backend, model) in enumerate(routes, 1):
+        streamed = []
+
+        def forward(token):
+            streamed.append(token)
+            on_token(token)
+
+        try:
+            return await backend_completion_async(backend, model, messages, max_tokens, use_cache=use_cache,
+                                                  on_token=forward if on_token is not None else None,
+                                                  priority=priority, group=group, task=task,
+                                                  retries=attempt == len(routes))
+        except NETWORK_ERRORS as e:
+            if attempt == len(routes) or streamed:
+                raise
+            logging.warning(f"{backend.name} failed for {task}: {e!r}; falling back to {routes[attempt][0].name}")
+
+async def summarize_paper_async(text, use_cache=True, on_token=None, priority=INTERACTIVE, group=None):
+    try:
+        return await chat_completion_async('summary', summary_messages(text), SUMMARY_MAX_TOKENS,
+                                           use_cache=use_cache, on_token=on_token, priority=priority, group=group)
+    except API_ERRORS as e:
+        logging.error(f"Error in API request: {str(e)}")
+        return f"Error in API request: {str(e)}"
+
+async def compress_chat_session_async(session, use_cache=True):
+    request = await run_blocking(session.compression_request)
+    if request is None:
+        return
+    messages, turns = request
+    try:
+        summary = await chat_completion_async('compress', messages, COMPRESS_MAX_TOKENS, use_cache=use_cache,
+                                              group=session.paper_id)
+    except API_ERRORS as e:
+        logging.warning(f"Error compressing chat history: {str(e)}")
+        return
+    if summary:
+        session.compress(summary, turns)
+        await run_blocking(record_chat_summary, session)
+        logging.info(f"Compressed {turns} chat messages into the running summary")
+
+async def talk_to_paper_with_groq_async(paper_content, question, use_cache=True, on_token=None, session=None):
+    if session is not None:
+        await compress_chat_session_async(session, use_cache)
+    messages = session.messages(question) if session is not None else chat_messages(paper_content, question)
+    try:
+        logging.info("Sending request to Groq API for paper chat")
+        answer = await chat_completion_async('chat', messages, CHAT_MAX_TOKENS,
+                                             use_cache=use_cache, on_token=on_token,
+                                             group=session.paper_id if session is not None else None)
+        if session is not None and answer:
+            session.add_turn(question, answer)
+            await compress_chat_session_async(session, use_cache)
+        return answer
+    except API_ERRORS as e:
+        logging.error(f"Error in talking to paper with Groq: {str(e)}")
+        return f"Error in talking to paper with Groq: {str(e)}"
+
+async def translate_with_groq_async(text, target_language="en", use_cache=True, on_token=None):
+    try:
+        logging.info("Sending request to Groq API for translation")
+        return await chat_completion_async('translate', translation_messages(text, target_language), TRANSLATE_MAX_TOKENS,
+                                           use_cache=use_cache, on_token=on_token)
+    except API_ERRORS as e:
+        logging.error(f"Error in translation with Groq: {str(e)}")
+        return f"Error in translation with Groq: {str(e)}"
+
+async def summarize_papers_async(papers, on_result=None, max_workers=None, use_cache=True, group='batch'):
+    semaphore = asyncio.Semaphore(max_workers or get_setting('Batch', 'SUMMARY_WORKERS', 4, int))
+    summaries = {}
+
+    async def summarize(paper):
+        async with semaphore:
+            summaries[paper['id']] = await summarize_paper_async(paper['summary'], use_cache, priority=BATCH, group=group)
+        await run_blocking(record_summary, paper['id'], summaries[paper['id']])
+        if on_result is not None:
+            on_result(paper, summaries[paper['id']])
+
+    await asyncio.gather(*(summarize(paper) for paper in papers))
+    return summaries
+
+async def _fetch_to_part_async(pdf_url, part_path, max_rate=None):
+    offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    headers = {'Range': f'bytes={offset}-'} if offset else {}
+    async with await request_with_retries('GET', pdf_url, headers=headers) as response:
+        if response.status == 416:
+            os.remove(part_path)
+            return await _fetch_to_part_async(pdf_url, part_path, max_rate)
+        response.raise_for_status()
+        if offset and response.status != 206:
+            offset = 0
+        expected = expected_size(response.status, response.headers)
+        start = time.monotonic()
+        received = 0
+        with open(part_path, 'ab' if offset else 'wb') as f:
+            async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                f.write(chunk)
+                # Throttled until someone asks for this paper, then it finishes at full speed
+                if max_rate and part_path not in _interactive_downloads:
+                    received += len(chunk)
+                    delay = received / max_rate - (time.monotonic() - start)
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+    return expected
+
+async def download_paper_async(pdf_url, paper_id, directory=None, max_rate=None):
+    # Same store layout and resume logic as paper_store.download_paper.
+    # max_rate (bytes per second) limits prefetches; a call without it lifts the limit of one in progress.
+    path, done = download_target(pdf_url, paper_id, directory)
+    if done:
+        return path
+
+    part_path = path + '.part'
+    if not max_rate:
+        _interactive_downloads.add(part_path)
+    try:
+        with metrics.timed('prefetch_download' if max_rate else 'download') as timer:
+            path = await _download_paper_async(pdf_url, paper_id, path, max_rate)
+            if path is None:
+                timer.outcome = 'error'
+    finally:
+        if not max_rate:
+            _interactive_downloads.discard(part_path)
+    return path
+
+async def _download_paper_async(pdf_url, paper_id, path, max_rate=None):
+    async with _download_locks.setdefault(path, asyncio.Lock()):
+        if os.path.exists(path):
+            return path
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        part_path = path + '.part'
+        for attempt in range(MAX_RESUME_ATTEMPTS):
+            try:
+                expected = await _fetch_to_part_async(pdf_url, part_path, max_rate)
+            except (aiohttp.ClientPayloadError, aiohttp.ServerDisconnectedError) as e:
+                logging.warning(f"Download of {paper_id} interrupted, resuming: {e}")
+                continue
+            except NETWORK_ERRORS as e:
+                logging.error(f"Error downloading paper {paper_id}: {e}")
+                return None
+            # Also records the path in the library, so off the loop
+            result = await run_blocking(check_part, paper_id, path, expected)
+            if result is not RESUME:
+                return result
+        logging.error(f"Giving up on downloading paper {paper_id} after {MAX_RESUME_ATTEMPTS} attempts")
+        return None
+
+async def download_papers_async(papers, max_workers=None, directory=None, on_result=None):
+    semaphore = asyncio.Semaphore(max_workers or get_setting('Papers', 'DOWNLOAD_WORKERS', 4, int))
+    results = {}
+
+    async def download(paper):
+        async with semaphore:
+            results[paper['id']] = await download_paper_async(paper['pdf_url'], paper['id'], directory)
+        if on_result is not None:
+            on_result(paper, results[paper['id']])
+
+    await asyncio.gather(*(download(paper) for paper in papers))
+    return results
+
+async def paper_text_async(paper):
+    text = await run_blocking(stored_paper_text, paper)
+    if text:
+        return text
+    filename = await download_paper_async(paper['pdf_url'], paper['id'])
+    if not filename:
+        return None
+    # PDF extraction is CPU-bound, keep it off the event loop
+    return await run_blocking(extract_paper_text, filename, paper)
+
+async def index_paper_async(paper):
+    text = await paper_text_async(paper)
+    if not text:
+        return None
+    return await run_blocking(index_paper_text, text, paper)
+
+async def summarize_long_text_async(text, use_cache=True, on_token=None, max_workers=None, priority=INTERACTIVE, group=None):
+    # Same map-reduce as arxiv_utils.summarize_long_text, with the chunk calls run as concurrent tasks
+    try:
+        model = task_model('summary')
+    except BackendError as e:
+        logging.error(f"Error in API request: {str(e)}")
+        return f"Error in API request: {str(e)}"
+    chunks = await run_blocking(summary_chunks, text, model)
+    if chunks is None:
+        return await summarize_paper_async(text, use_cache=use_cache, on_token=on_token, priority=priority, group=group)
+
+    semaphore = asyncio.Semaphore(max_workers or get_setting('Batch', 'SUMMARY_WORKERS', 4, int))
+
+    async def summarize(messages):
+        async with semaphore:
+            return await chat_completion_async('summary', messages, SUMMARY_MAX_TOKENS, use_cache=use_cache,
+                                               priority=priority, group=group)
+
+    logging.info(f"Summarizing {len(chunks)} chunks in parallel")
+    rounds = summary_rounds(chunks, model)
+    try:
+        prompts, final = next(rounds)
+        while not final:
+            summaries = await asyncio.gather(*(summarize(messages) for messages in prompts))
+            # Grouping the summaries counts their tokens, so it runs off the loop
+            prompts, final = await run_blocking(rounds.send, list(summaries))
+        return await chat_completion_async('summary', prompts[0], SUMMARY_MAX_TOKENS,
+                                           use_cache=use_cache, on_token=on_token, priority=priority, group=group)
+    except API_ERRORS as e:
+        logging.error(f"Error in API request: {str(e)}")
+        return f"Error in API request: {str(e)}"
+
+async def summarize_full_paper_async(paper, use_cache=True, on_token=None, priority=INTERACTIVE):
+    text = await paper_text_async(paper)
+    if not text:
+        return "Error: Could not read the paper's full text"
+    return await summarize_long_text_async(text, use_cache=use_cache, on_token=on_token, priority=priority, group=paper['id'])
+
+async def poll_watch_async(watch):
+    # watch.poll_watch with the fetches awaited
+    poll = WatchPoll(watch)
+    for request in poll.requests():
+        papers = await fetch_arxiv_papers_async(**request)
+        if papers is None:
+            return None
+        poll.add_page(papers)
+    return await run_blocking(poll.finish)
+
+async def poll_watches_async(watches=None, force=False, summarize=None, on_new=None, on_summary=None):
+    found = {}
+    for watch in watches if watches is not None else await run_blocking(due_watches, force):
+        add_found(found, watch, await poll_watch_async(watch), on_new)
+    papers = papers_to_summarize(found, summarize)
+    if papers:
+        await summarize_papers_async(papers, on_result=on_summary, group='watch')
+    return found
@@ -0,0 +1,73 @@
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from metrics import percentile
+
+ANSWER = ("The paper evaluates the method on three benchmarks and reports consistent gains over the baselines, "
+          "with the largest improvement on long inputs.\n") * 3
+
+def summary(values):
+    return {
+        'p50_ms': round(percentile(values, 0.50) * 1000, 3),
+        'p95_ms': round(percentile(values, 0.95) * 1000, 3),
+        'max_ms': round(max(values) * 1000, 3),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure loading, appending to and streaming into the chat pane")
+    parser.add_argument('--messages', type=int, default=2000, help="history loaded before streaming")
+    parser.add_argument('--tokens', type=int, default=500, help="tokens streamed into the last answer")
+    parser.add_argument('--platform', default='offscreen', help="QT_QPA_PLATFORM ('' keeps the current one)")
+    args = parser.parse_args()
+    if args.platform:
+        os.environ['QT_QPA_PLATFORM'] = args.platform
+
+    from PyQt5.QtWidgets import QApplication
+    app = QApplication(sys.argv)
+    from main import ChatView
+
+    view = ChatView()
+    view.resize(400, 600)
+    view.show()
+    app.processEvents()
+
+    history = [(f"Question {i}: what about section {i}?" if i % 2 == 0 else ANSWER, i % 2 == 0) for i in range(args.messages)]
+    start = time.perf_counter()
+    view.set_messages(history)
+    app.processEvents()
+    load = time.perf_counter() - start
+
+    # A new question and answer appended to the full history, then tokens streamed as the GUI receives them
+    appends = []
+    for i in range(20):
+        start = time.perf_counter()
+        view.add_message(f"Follow-up {i}", i % 2 == 0)
+        app.processEvents()
+        appends.append(time.perf_counter() - start)
+    answer = view.add_message("Thinking...", False)
+    answer.set_text("")
+    tokens = []
+    words = ANSWER.split(' ')
+    for i in range(args.tokens):
+        start = time.perf_counter()
+        answer.append_text(words[i % len(words)] + ' ')
+        app.processEvents()
+        tokens.append(time.perf_counter() - start)
+
+    results = {
+        'messages': args.messages,
+        'load_history_ms': round(load * 1000, 1),
+        'append_message': summary(appends),
+        'stream_token': summary(tokens),
+        'stream_token_mean_ms': round(statistics.mean(tokens) * 1000, 3),
+    }
+    print(json.dumps(results, indent=2))
+
+if __name__ == '__main__':
+    main()
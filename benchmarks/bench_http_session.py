@@ -0,0 +1,85 @@
+import argparse
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from http_client import build_session
+
+BODY = b'<?xml version="1.0" encoding="UTF-8"?><feed xmlns="http://www.w3.org/2005/Atom"></feed>'
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Avoid Nagle/delayed-ACK stalls on reused connections
+    disable_nagle_algorithm = True
+    connect_delay = 0.0
+
+    def setup(self):
+        # Emulate the TCP+TLS handshake round trips paid once per new connection
+        time.sleep(self.connect_delay)
+        super().setup()
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/atom+xml')
+        self.send_header('Content-Length', str(len(BODY)))
+        self.end_headers()
+        self.wfile.write(BODY)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_stub_server(connect_delay):
+    StubHandler.connect_delay = connect_delay
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def run(label, get, url, requests_count, concurrency):
+    def timed_get(_):
+        start = time.perf_counter()
+        get(url).raise_for_status()
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        latencies = sorted(executor.map(timed_get, range(requests_count)))
+    elapsed = time.perf_counter() - start
+    return {
+        'client': label,
+        'requests': requests_count,
+        'concurrency': concurrency,
+        'throughput_rps': round(requests_count / elapsed, 1),
+        'p50_ms': round(statistics.median(latencies) * 1000, 2),
+        'p95_ms': round(latencies[int(len(latencies) * 0.95) - 1] * 1000, 2),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare bare requests.get with the pooled keep-alive session")
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--connect-delay', type=float, default=0.02, help="simulated handshake cost per new connection (s)")
+    args = parser.parse_args()
+
+    server = start_stub_server(args.connect_delay)
+    url = f"http://127.0.0.1:{server.server_address[1]}/api/query"
+    session = build_session(pool_maxsize=args.concurrency)
+    try:
+        results = [
+            run('requests.get', requests.get, url, args.requests, args.concurrency),
+            run('pooled_session', session.get, url, args.requests, args.concurrency),
+        ]
+    finally:
+        server.shutdown()
+    print(json.dumps(results, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+import argparse
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+from xml.etree import ElementTree
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from arxiv_feed import iter_arxiv_entries
+
+ENTRY = """  <entry>
+    <id>http://arxiv.org/abs/2401.{n:05d}v{version}</id>
+    <updated>2024-01-{day:02d}T12:00:00Z</updated>
+    <published>2024-01-{day:02d}T09:30:00Z</published>
+    <title>Synthetic paper number {n} on scalable inference</title>
+    <summary>{summary}</summary>
+{authors}    <arxiv:doi>10.1000/synthetic.{n}</arxiv:doi>
+    <link href="http://arxiv.org/abs/2401.{n:05d}v{version}" rel="alternate" type="text/html"/>
+{pdf_link}    <arxiv:primary_category term="cs.LG" scheme="http://arxiv.org/schemas/atom"/>
+    <category term="cs.LG" scheme="http://arxiv.org/schemas/atom"/>
+    <category term="stat.ML" scheme="http://arxiv.org/schemas/atom"/>
+  </entry>
+"""
+
+def synthetic_feed(entries):
+    summary = "We study a synthetic problem in great detail. " * 30
+    parts = ['<?xml version="1.0" encoding="UTF-8"?>\n'
+             '<feed xmlns="http://www.w3.org/2005/Atom" xmlns:arxiv="http://arxiv.org/schemas/atom">\n'
+             '  <title>arXiv Query</title>\n']
+    for n in range(entries):
+        authors = "".join(f"    <author><name>Author {n}-{i}</name></author>\n" for i in range(6))
+        # Every 50th entry has no PDF link, as happens for some withdrawn papers
+        pdf_link = "" if n % 50 == 0 else f'    <link title="pdf" href="http://arxiv.org/pdf/2401.{n:05d}v1" rel="related" type="application/pdf"/>\n'
+        parts.append(ENTRY.format(n=n, version=n % 3 + 1, day=n % 28 + 1, summary=summary, authors=authors, pdf_link=pdf_link))
+    parts.append('</feed>\n')
+    return "".join(parts).encode("utf-8")
+
+def tree_parse(content):
+    # The previous parser: build the whole tree, then find() each field
+    root = ElementTree.fromstring(content)
+    papers = []
+    for entry in root.findall("{http://www.w3.org/2005/Atom}entry"):
+        paper_id = entry.find("{http://www.w3.org/2005/Atom}id").text.split("/")[-1]
+        published_date = entry.find("{http://www.w3.org/2005/Atom}published").text.split("T")[0]
+        authors = [author.find("{http://www.w3.org/2005/Atom}name").text for author in entry.findall("{http://www.w3.org/2005/Atom}author")]
+        paper = {
+            "id": paper_id,
+            "title": entry.find("{http://www.w3.org/2005/Atom}title").text,
+            "summary": entry.find("{http://www.w3.org/2005/Atom}summary").text,
+            "pdf_url": next((link.get('href') for link in entry.findall("{http://www.w3.org/2005/Atom}link") if link.get('title') == 'pdf'), None),
+            "published_date": published_date,
+            "authors": authors,
+        }
+        papers.append(paper)
+    return papers
+
+def stream_parse(content, chunk_size):
+    # Consume the records one at a time, as a streaming caller would
+    count = 0
+    chunks = (content[i:i + chunk_size] for i in range(0, len(content), chunk_size))
+    for _ in iter_arxiv_entries(chunks):
+        count += 1
+    return count
+
+def measure(label, func, repeat):
+    timings = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    gc.collect()
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {
+        'parser': label,
+        'best_ms': round(min(timings) * 1000, 1),
+        'mean_ms': round(sum(timings) / len(timings) * 1000, 1),
+        'peak_memory_kb': round(peak / 1024, 1),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the tree-based and streaming arXiv Atom parsers")
+    parser.add_argument('--entries', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--chunk-size', type=int, default=64 * 1024)
+    args = parser.parse_args()
+
+    content = synthetic_feed(args.entries)
+    results = {
+        'entries': args.entries,
+        'feed_kb': round(len(content) / 1024, 1),
+        'results': [
+            measure('elementtree_fromstring', lambda: len(tree_parse(content)), args.repeat),
+            measure('streaming_pull_parser', lambda: stream_parse(content, args.chunk_size), args.repeat),
+        ],
+    }
+    print(json.dumps(results, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Loaded on first use only; importing any of these at startup is a regression
+DEFERRED_MODULES = (
+    'PyQt5.QtWebEngineWidgets',
+    'google.generativeai',
+    'fitz',
+    'tiktoken',
+    'aiohttp',
+    'requests',
+    'async_client',
+    'arxiv_utils',
+)
+
+# Runs in a fresh interpreter: prints the time from process start until the window has been shown
+# and the event loop is running
+FIRST_WINDOW = """
+import sys, time
+from PyQt5.QtCore import Qt, QTimer
+from PyQt5.QtWidgets import QApplication
+QApplication.setAttribute(Qt.AA_ShareOpenGLContexts)
+app = QApplication(sys.argv)
+import main
+window = main.ArxivApp()
+window.show()
+window.runner.start()
+def shown():
+    print(time.perf_counter(), flush=True)
+    app.quit()
+QTimer.singleShot(0, shown)
+app.exec_()
+window.runner.shutdown()
+"""
+
+def child_env(platform):
+    env = dict(os.environ)
+    if platform:
+        env['QT_QPA_PLATFORM'] = platform
+    return env
+
+def import_profile(env, top):
+    # -X importtime lines: "import time: self [us] | cumulative | imported package"
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import main'],
+                            cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        modules.append({'module': name.strip(), 'self_ms': int(self_us) / 1000, 'cumulative_ms': int(cumulative_us) / 1000})
+    loaded = {module['module'] for module in modules}
+    total = next((module['cumulative_ms'] for module in modules if module['module'] == 'main'), None)
+    return {
+        'import_main_ms': total,
+        'modules_imported': len(modules),
+        'deferred_modules_loaded': [name for name in DEFERRED_MODULES if name in loaded],
+        'slowest_imports': sorted(modules, key=lambda module: module['self_ms'], reverse=True)[:top],
+    }
+
+def first_window(env):
+    # Measured from the parent so interpreter startup is included
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, '-c', FIRST_WINDOW], cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    shown = float(result.stdout.split()[-1])
+    return (shown - start) * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description="Profile GUI startup: import times and time to first window")
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=15, help="slowest imports to list")
+    parser.add_argument('--platform', default='offscreen', help="QT_QPA_PLATFORM for the child processes ('' keeps the current one)")
+    parser.add_argument('--max-first-window-ms', type=float, help="exit with status 1 if the median is slower")
+    args = parser.parse_args()
+
+    env = child_env(args.platform)
+    profile = import_profile(env, args.top)
+    timings = [first_window(env) for _ in range(args.runs)]
+    results = {
+        'runs': args.runs,
+        'first_window_ms': {
+            'median': round(statistics.median(timings), 1),
+            'min': round(min(timings), 1),
+            'max': round(max(timings), 1),
+        },
+        **profile,
+    }
+    print(json.dumps(results, indent=2))
+
+    failed = bool(profile['deferred_modules_loaded'])
+    if args.max_first_window_ms is not None and statistics.median(timings) > args.max_first_window_ms:
+        failed = True
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,211 @@
+import argparse
+import configparser
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from metrics import percentile
+from mock_server import MockOptions, start_mock_server
+
+SCENARIOS = ('parse', 'fetch', 'download', 'summarize', 'stream', 'chat')
+
+ABSTRACT = ("We propose a method for scalable inference in large models and evaluate it on standard benchmarks. "
+            "Results show consistent gains in accuracy and a large reduction in compute. ") * 4
+
+def write_config(directory, base_url, args):
+    # The repo's key.ini pointed at the mock server, with caches, library and papers in a scratch directory
+    config = configparser.ConfigParser(delimiters=('=',))
+    config.read(os.path.join(ROOT, 'key.ini'))
+    config['Groq']['API_BASE'] = f"{base_url}/openai/v1"
+    config['Groq']['API_KEY'] = 'benchmark'
+    for key in ('REQUESTS_PER_MINUTE', 'TOKENS_PER_MINUTE'):
+        config.remove_option('Groq', key)
+    if args.groq_rpm:
+        config['Groq']['REQUESTS_PER_MINUTE'] = str(args.groq_rpm)
+    if config.has_section('Routing'):
+        config.remove_section('Routing')
+    config['arXiv']['API_URL'] = f"{base_url}/api/query?"
+    config['HTTP']['POOL_MAXSIZE'] = str(max(args.concurrency))
+    config['Cache']['CACHE_DIR'] = os.path.join(directory, 'cache')
+    config['Papers']['PAPER_DIR'] = os.path.join(directory, 'papers')
+    config['Library']['LIBRARY_PATH'] = os.path.join(directory, 'library.sqlite3')
+    if args.tokenizer:
+        config['Models']['TOKENIZER'] = args.tokenizer
+    path = os.path.join(directory, 'key.ini')
+    with open(path, 'w') as f:
+        config.write(f)
+    return path
+
+def build_scenarios(base_url, args, run_id):
+    import arxiv_utils
+    import http_client
+
+    feed = http_client.get(f"{base_url}/api/query?max_results={args.entries}").content
+    first_tokens = []
+
+    def parse(i):
+        if not arxiv_utils.parse_arxiv_response(feed):
+            raise RuntimeError("No entries parsed")
+
+    def fetch(i):
+        # A new query each call, so the search cache is never hit
+        if arxiv_utils.fetch_arxiv_papers(f"benchmark {run_id} {i}", max_results=args.page_size, use_cache=False) is None:
+            raise RuntimeError("Fetch failed")
+
+    def download(i):
+        paper_id = f"bench.{run_id}{i:05d}v1"
+        if arxiv_utils.download_paper(f"{base_url}/pdf/{paper_id}", paper_id) is None:
+            raise RuntimeError("Download failed")
+
+    def check(result):
+        if not result or result.startswith("Error"):
+            raise RuntimeError(result or "Empty completion")
+
+    def summarize(i):
+        check(arxiv_utils.summarize_paper(f"{i} {ABSTRACT}", use_cache=False))
+
+    def stream(i):
+        start = time.perf_counter()
+        tokens = []
+
+        def on_token(token):
+            if not tokens:
+                first_tokens.append(time.perf_counter() - start)
+            tokens.append(token)
+
+        check(arxiv_utils.translate_with_groq(f"{i} {ABSTRACT}", "French", use_cache=False, on_token=on_token))
+
+    def chat(i):
+        check(arxiv_utils.talk_to_paper_with_groq(ABSTRACT, f"Question {i}: what is the main contribution?", use_cache=False))
+
+    return {'parse': parse, 'fetch': fetch, 'download': download, 'summarize': summarize, 'stream': stream, 'chat': chat}, first_tokens
+
+def run_calls(func, offset, count, concurrency):
+    def timed(i):
+        start = time.perf_counter()
+        try:
+            func(offset + i)
+            return time.perf_counter() - start, None
+        except Exception as e:
+            return time.perf_counter() - start, repr(e)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        return list(executor.map(timed, range(count)))
+
+def measure(name, func, requests_count, concurrency, offset, memory_requests, first_tokens):
+    del first_tokens[:]
+    gc.collect()
+    start = time.perf_counter()
+    outcomes = run_calls(func, offset, requests_count, concurrency)
+    elapsed = time.perf_counter() - start
+    latencies = [latency for latency, error in outcomes if error is None]
+    errors = [error for latency, error in outcomes if error is not None]
+    result = {
+        'scenario': name,
+        'concurrency': concurrency,
+        'requests': requests_count,
+        'errors': len(errors),
+        'throughput_rps': round(len(latencies) / elapsed, 2),
+    }
+    if latencies:
+        result.update({
+            'p50_ms': round(percentile(latencies, 0.50) * 1000, 2),
+            'p95_ms': round(percentile(latencies, 0.95) * 1000, 2),
+            'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+            'max_ms': round(max(latencies) * 1000, 2),
+        })
+    if first_tokens:
+        result['first_token_p50_ms'] = round(percentile(first_tokens, 0.50) * 1000, 2)
+        result['first_token_p95_ms'] = round(percentile(first_tokens, 0.95) * 1000, 2)
+    if errors:
+        result['first_error'] = errors[0]
+    # Separate, shorter pass for memory: tracing would skew the timings above
+    gc.collect()
+    tracemalloc.start()
+    run_calls(func, offset + requests_count, memory_requests, concurrency)
+    result['peak_memory_kb'] = round(tracemalloc.get_traced_memory()[1] / 1024, 1)
+    tracemalloc.stop()
+    return result
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark arXiv fetching, parsing, downloads and Groq calls against the local mock server")
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help=f"comma-separated subset of {','.join(SCENARIOS)}")
+    parser.add_argument('--concurrency', default='1,4,16', help="comma-separated concurrency levels")
+    parser.add_argument('--requests', type=int, default=40, help="calls per scenario and concurrency level")
+    parser.add_argument('--memory-requests', type=int, default=10, help="calls in the traced memory pass")
+    parser.add_argument('--entries', type=int, default=200, help="feed size for the parse scenario")
+    parser.add_argument('--page-size', type=int, default=20, help="results per fetch")
+    parser.add_argument('--fixtures', help="recorded feeds and PDFs to replay (see mock_server.py record)")
+    parser.add_argument('--pdf-kb', type=int, default=512)
+    parser.add_argument('--llm-latency', type=float, default=0.2)
+    parser.add_argument('--token-delay', type=float, default=0.005)
+    parser.add_argument('--completion-words', type=int, default=80)
+    parser.add_argument('--rate-limit-every', type=int, default=0, help="mock answers every Nth completion with a 429")
+    parser.add_argument('--groq-rpm', type=int, help="apply a requests-per-minute limit (none by default)")
+    parser.add_argument('--tokenizer', help="override [Models] TOKENIZER")
+    parser.add_argument('--output', help="append the results as one JSON line to this file")
+    args = parser.parse_args()
+    args.concurrency = [int(level) for level in args.concurrency.split(',')]
+    scenarios = [name.strip() for name in args.scenarios.split(',')]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    options = MockOptions(args.fixtures, max(args.entries, args.page_size), args.pdf_kb, args.llm_latency, args.token_delay,
+                          args.completion_words, args.rate_limit_every, 1)
+    server = start_mock_server(options)
+    server.pdf('warmup')  # Build the synthetic PDF before anything is timed
+    directory = tempfile.mkdtemp(prefix='garx-bench-')
+    import settings
+    settings.set_config_path(write_config(directory, server.url, args))
+    functions, first_tokens = build_scenarios(server.url, args, int(time.time()))
+
+    results = []
+    offset = 0
+    for name in scenarios:
+        for concurrency in args.concurrency:
+            result = measure(name, functions[name], args.requests, concurrency, offset, args.memory_requests, first_tokens)
+            offset += args.requests + args.memory_requests
+            results.append(result)
+            print(f"{name} x{concurrency}: {result.get('p50_ms')} ms p50, {result['throughput_rps']} req/s", file=sys.stderr)
+    server.shutdown()
+
+    report = {
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'options': {key: value for key, value in vars(args).items() if key != 'output'},
+        'server': server.stats_snapshot(),
+        'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss if resource else None,
+        'results': results,
+    }
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, 'a') as f:
+            f.write(json.dumps(report) + "\n")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,272 @@
+import argparse
+import glob
+import itertools
+import json
+import os
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlparse
+from xml.etree import ElementTree
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from bench_parser import synthetic_feed
+
+ATOM = "http://www.w3.org/2005/Atom"
+ARXIV = "http://arxiv.org/schemas/atom"
+ElementTree.register_namespace('', ATOM)
+ElementTree.register_namespace('arxiv', ARXIV)
+ElementTree.register_namespace('opensearch', "http://a9.com/-/spec/opensearch/1.1/")
+
+WORDS = ("the model improves results on standard benchmarks while reducing compute and the analysis shows "
+         "which components matter most for accuracy and robustness across datasets").split()
+
+class MockOptions:
+    def __init__(self, fixtures=None, entries=200, pdf_kb=512, llm_latency=0.2, token_delay=0.01,
+                 completion_words=80, rate_limit_every=0, retry_after=1):
+        self.fixtures = fixtures
+        self.entries = entries
+        self.pdf_kb = pdf_kb
+        self.llm_latency = llm_latency  # Seconds before the first byte of a completion
+        self.token_delay = token_delay  # Seconds between streamed tokens
+        self.completion_words = completion_words
+        self.rate_limit_every = rate_limit_every  # Every Nth completion request gets a 429; 0 disables
+        self.retry_after = retry_after
+
+def load_entries(options):
+    # Entries of the recorded feeds in the fixtures directory, or a synthetic feed without fixtures
+    feeds = sorted(glob.glob(os.path.join(options.fixtures, '*.xml'))) if options.fixtures else []
+    contents = [open(path, 'rb').read() for path in feeds] or [synthetic_feed(options.entries)]
+    entries = []
+    for content in contents:
+        entries.extend(ElementTree.fromstring(content).findall(f"{{{ATOM}}}entry"))
+    return entries
+
+def entry_id(entry):
+    return entry.find(f"{{{ATOM}}}id").text.split('/abs/')[-1]
+
+def synthetic_pdf(size_kb):
+    try:
+        import fitz
+    except ImportError:
+        return b"%PDF-1.4\n" + b"0" * (size_kb * 1024)
+    document = fitz.open()
+    text = " ".join(itertools.islice(itertools.cycle(WORDS), 400))
+    while True:
+        for _ in range(10):
+            page = document.new_page()
+            page.insert_textbox(page.rect + (50, 50, -50, -50), text)
+        data = document.tobytes()
+        if len(data) >= size_kb * 1024 or len(document) >= 200:
+            return data
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path.endswith('/api/query'):
+            self.send_feed(parse_qs(url.query))
+        elif url.path.startswith('/pdf/'):
+            self.send_pdf(url.path[len('/pdf/'):])
+        elif url.path == '/stats':
+            self.send_body(200, json.dumps(self.server.stats_snapshot()).encode(), 'application/json')
+        else:
+            self.send_body(404, b'Not found', 'text/plain')
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length)
+        if not urlparse(self.path).path.endswith('/chat/completions'):
+            self.send_body(404, b'Not found', 'text/plain')
+            return
+        self.send_completion(json.loads(body))
+
+    def send_body(self, status, body, content_type, headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+        self.server.count('bytes_sent', len(body))
+
+    def send_feed(self, params):
+        self.server.count('feed_requests')
+        entries = self.server.entries
+        id_list = [paper_id for paper_id in params.get('id_list', [''])[0].split(',') if paper_id]
+        if id_list:
+            wanted = set(id_list)
+            selected = [entry for entry in entries if entry_id(entry) in wanted or entry_id(entry).rsplit('v', 1)[0] in wanted]
+        else:
+            # Every query matches the whole pool, rotated so different queries see different papers
+            start = int(params.get('start', ['0'])[0])
+            max_results = int(params.get('max_results', ['10'])[0])
+            offset = sum(params.get('search_query', [''])[0].encode()) % len(entries)
+            selected = [entries[(offset + start + i) % len(entries)] for i in range(min(max_results, len(entries)))]
+        feed = ElementTree.Element(f"{{{ATOM}}}feed")
+        ElementTree.SubElement(feed, f"{{{ATOM}}}title").text = "arXiv Query"
+        feed.extend(selected)
+        self.send_body(200, ElementTree.tostring(feed, encoding='utf-8', xml_declaration=True), 'application/atom+xml')
+
+    def send_pdf(self, paper_id):
+        self.server.count('pdf_requests')
+        data = self.server.pdf(paper_id)
+        match = re.match(r'bytes=(\d+)-', self.headers.get('Range') or '')
+        if match is None:
+            self.send_body(200, data, 'application/pdf')
+            return
+        offset = int(match.group(1))
+        if offset >= len(data):
+            self.send_body(416, b'', 'application/pdf', {'Content-Range': f'bytes */{len(data)}'})
+            return
+        self.send_body(206, data[offset:], 'application/pdf', {'Content-Range': f'bytes {offset}-{len(data) - 1}/{len(data)}'})
+
+    def send_completion(self, request):
+        options = self.server.options
+        number = self.server.count('completion_requests')
+        if options.rate_limit_every and number % options.rate_limit_every == 0:
+            self.server.count('rate_limited')
+            error = json.dumps({"error": {"message": "Rate limit reached", "type": "requests", "code": "rate_limit_exceeded"}})
+            self.send_body(429, error.encode(), 'application/json', {'Retry-After': str(options.retry_after)})
+            return
+        prompt_tokens = sum(len(message['content']) for message in request['messages']) // 4 + 1
+        words = min(options.completion_words, request.get('max_tokens') or options.completion_words)
+        tokens = [word + ' ' for word in itertools.islice(itertools.cycle(WORDS), words)]
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(tokens), "total_tokens": prompt_tokens + len(tokens)}
+        time.sleep(options.llm_latency)
+        if not request.get('stream'):
+            time.sleep(options.token_delay * len(tokens))
+            body = {"id": f"chatcmpl-{number}", "object": "chat.completion", "model": request.get('model'),
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": "".join(tokens)}, "finish_reason": "stop"}],
+                    "usage": usage}
+            self.send_body(200, json.dumps(body).encode(), 'application/json')
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        for token in tokens:
+            chunk = {"id": f"chatcmpl-{number}", "object": "chat.completion.chunk", "model": request.get('model'),
+                     "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}]}
+            self.write_chunk(f"data: {json.dumps(chunk)}\n\n".encode())
+            time.sleep(options.token_delay)
+        final = {"id": f"chatcmpl-{number}", "object": "chat.completion.chunk", "model": request.get('model'),
+                 "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}], "x_groq": {"usage": usage}}
+        self.write_chunk(f"data: {json.dumps(final)}\n\n".encode())
+        self.write_chunk(b"data: [DONE]\n\n")
+        self.write_chunk(b"")
+
+    def write_chunk(self, data):
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+        self.server.count('bytes_sent', len(data))
+
+    def log_message(self, format, *args):
+        pass
+
+class MockServer(ThreadingHTTPServer):
+    # Stand-in for export.arxiv.org (feeds and PDFs) and Groq's OpenAI-compatible /chat/completions
+    daemon_threads = True
+
+    def __init__(self, address, options):
+        super().__init__(address, MockHandler)
+        self.options = options
+        self.url = f"http://{self.server_address[0]}:{self.server_address[1]}"
+        self.entries = load_entries(options)
+        # PDF links point back at this server
+        for entry in self.entries:
+            for link in entry.findall(f"{{{ATOM}}}link"):
+                if link.get('title') == 'pdf':
+                    link.set('href', f"{self.url}/pdf/{entry_id(entry)}")
+        self.stats = {}
+        self.lock = threading.Lock()
+        self.default_pdf = None
+
+    def count(self, name, amount=1):
+        with self.lock:
+            self.stats[name] = self.stats.get(name, 0) + amount
+            return self.stats[name]
+
+    def stats_snapshot(self):
+        with self.lock:
+            return dict(self.stats)
+
+    def pdf(self, paper_id):
+        recorded = os.path.join(self.options.fixtures, paper_id + '.pdf') if self.options.fixtures else None
+        if recorded and os.path.exists(recorded):
+            with open(recorded, 'rb') as f:
+                return f.read()
+        with self.lock:
+            if self.default_pdf is None:
+                self.default_pdf = synthetic_pdf(self.options.pdf_kb)
+            return self.default_pdf
+
+def start_mock_server(options=None, host='127.0.0.1', port=0):
+    server = MockServer((host, port), options or MockOptions())
+    threading.Thread(target=server.serve_forever, name="garx-mock-server", daemon=True).start()
+    return server
+
+def record_fixtures(query, directory, max_results, with_pdfs):
+    # Saves a live arXiv feed (and optionally its PDFs) for the server to replay
+    import requests
+    os.makedirs(directory, exist_ok=True)
+    params = {"search_query": f"all:{query}", "start": 0, "max_results": max_results}
+    response = requests.get("http://export.arxiv.org/api/query?" + urlencode(params), timeout=60)
+    response.raise_for_status()
+    name = re.sub(r'\W+', '_', query).strip('_') or 'feed'
+    with open(os.path.join(directory, name + '.xml'), 'wb') as f:
+        f.write(response.content)
+    entries = ElementTree.fromstring(response.content).findall(f"{{{ATOM}}}entry")
+    if with_pdfs:
+        for entry in entries:
+            link = next((link.get('href') for link in entry.findall(f"{{{ATOM}}}link") if link.get('title') == 'pdf'), None)
+            if link:
+                pdf = requests.get(link, timeout=120)
+                pdf.raise_for_status()
+                with open(os.path.join(directory, entry_id(entry) + '.pdf'), 'wb') as f:
+                    f.write(pdf.content)
+                time.sleep(3)  # arXiv asks for a delay between requests
+    print(json.dumps({'feed': name + '.xml', 'entries': len(entries), 'pdfs': with_pdfs}))
+
+def main():
+    parser = argparse.ArgumentParser(description="Local mock of the arXiv API and Groq chat completions")
+    commands = parser.add_subparsers(dest='command')
+    serve = commands.add_parser('serve', help="run the mock server (default)")
+    serve.add_argument('--host', default='127.0.0.1')
+    serve.add_argument('--port', type=int, default=8008)
+    serve.add_argument('--fixtures', help="directory of recorded feeds (*.xml) and PDFs (<id>.pdf)")
+    serve.add_argument('--entries', type=int, default=200, help="synthetic feed size when there are no fixtures")
+    serve.add_argument('--pdf-kb', type=int, default=512, help="size of the synthetic PDF")
+    serve.add_argument('--llm-latency', type=float, default=0.2)
+    serve.add_argument('--token-delay', type=float, default=0.01)
+    serve.add_argument('--completion-words', type=int, default=80)
+    serve.add_argument('--rate-limit-every', type=int, default=0, help="answer every Nth completion with a 429")
+    serve.add_argument('--retry-after', type=int, default=1)
+    record = commands.add_parser('record', help="record a live arXiv feed into the fixtures directory")
+    record.add_argument('query')
+    record.add_argument('--fixtures', default='benchmarks/fixtures')
+    record.add_argument('-n', '--max-results', type=int, default=20)
+    record.add_argument('--pdfs', action='store_true', help="also download the PDFs")
+    args = parser.parse_args(sys.argv[1:] or ['serve'])
+
+    if args.command == 'record':
+        record_fixtures(args.query, args.fixtures, args.max_results, args.pdfs)
+        return
+    options = MockOptions(args.fixtures, args.entries, args.pdf_kb, args.llm_latency, args.token_delay,
+                          args.completion_words, args.rate_limit_every, args.retry_after)
+    server = MockServer((args.host, args.port), options)
+    print(f"Mock server on {server.url}; in key.ini set:\n"
+          f"  [arXiv] API_URL = {server.url}/api/query?\n"
+          f"  [Groq] API_BASE = {server.url}/openai/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
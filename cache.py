@@ -0,0 +1,126 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+from settings import get_setting
+
+CacheEntry = namedtuple('CacheEntry', ['value', 'etag', 'last_modified', 'stored_at'])
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+def make_key(*parts):
+    # Content-addressed key: a stable hash of the JSON-encoded parts
+    encoded = json.dumps(parts, sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+class DiskCache:
+    def __init__(self, path, ttl=None, max_entries=1000):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.revalidated = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, etag TEXT, last_modified TEXT, "
+            "stored_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed_at ON entries (accessed_at)")
+        self._conn.commit()
+
+    def is_fresh(self, entry):
+        return not self.ttl or time.time() - entry.stored_at < self.ttl
+
+    def get(self, key):
+        # Returns the entry even when stale so callers can revalidate it
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, etag, last_modified, stored_at FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+            entry = CacheEntry(json.loads(row[0]), row[1], row[2], row[3])
+            if self.is_fresh(entry):
+                self.hits += 1
+            else:
+                self.stale += 1
+            return entry
+
+    def set(self, key, value, etag=None, last_modified=None):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, etag, last_modified, stored_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, json.dumps(value), etag, last_modified, now, now),
+            )
+            # Evict least recently used entries beyond the size cap
+            cursor = self._conn.execute(
+                "DELETE FROM entries WHERE key IN "
+                "(SELECT key FROM entries ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+            self.evictions += max(cursor.rowcount, 0)
+            self._conn.commit()
+
+    def refresh(self, key):
+        # A stale entry was confirmed unchanged by the server (e.g. 304 Not Modified)
+        now = time.time()
+        with self._lock:
+            self._conn.execute("UPDATE entries SET stored_at = ?, accessed_at = ? WHERE key = ?", (now, now, key))
+            self._conn.commit()
+            self.revalidated += 1
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM entries")
+            self._conn.commit()
+
+    def stats(self):
+        with self._lock:
+            size = self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        lookups = self.hits + self.misses + self.stale
+        return {
+            'entries': size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'stale': self.stale,
+            'revalidated': self.revalidated,
+            'evictions': self.evictions,
+            'hit_rate': round((self.hits + self.revalidated) / lookups, 4) if lookups else 0.0,
+        }
+
+def get_cache(name):
+    # One cache per name, configured from the [Cache] section of key.ini
+    if name not in _caches:
+        with _caches_lock:
+            if name not in _caches:
+                prefix = name.upper()
+                cache_dir = get_setting('Cache', 'CACHE_DIR', '.garx_cache')
+                _caches[name] = DiskCache(
+                    os.path.join(cache_dir, f"{name}.sqlite3"),
+                    ttl=get_setting('Cache', f'{prefix}_TTL', None, float),
+                    max_entries=get_setting('Cache', f'{prefix}_MAX_ENTRIES', 1000, int),
+                )
+                logging.info(f"Opened {name} cache in {cache_dir}")
+    return _caches[name]
+
+def cache_stats():
+    return {name: cache.stats() for name, cache in _caches.items()}
@@ -0,0 +1,74 @@
+import threading
+from settings import get_setting
+from token_budget import count_message_tokens
+
+REVIEWER_PROMPT = "You are a professional academic paper reviewer and mentor named Garxt. As a professional academic paper reviewer and helpful mentor, you possess exceptional logical and critical thinking skills, enabling you to provide concise and insightful responses."
+POLITICS_PROMPT = "You are not allowed to discuss anything about politics, do not comment on anything about that."
+ANSWER_PROMPT = "You will be asked to answer questions about the paper with deep knowledge about it, providing clear and concise explanations in a helpful, friendly manner, using the asker's language."
+
+class ChatSession:
+    # One conversation about one paper. Messages are laid out so the start never changes between turns:
+    # instructions and abstract, then the running summary of compressed turns, then recent turns verbatim.
+    # Only the last message (the question and the excerpts retrieved for it) is new each turn, which keeps
+    # the prompt prefix cacheable on the provider side.
+    # A restored session starts from the stored summary, which covers the first `compressed` messages
+    # of the paper's chat; history holds the messages after those.
+    def __init__(self, paper_id, abstract, paper_index=None, history=None, summary=None, compressed=0):
+        self.paper_id = paper_id
+        self.abstract = abstract
+        self.paper_index = paper_index
+        self.summary = summary
+        self.compressed = compressed
+        self.turns = list(history or [])
+        self.lock = threading.Lock()
+
+    def prefix(self):
+        return [
+            {"role": "system", "content": REVIEWER_PROMPT},
+            {"role": "system", "content": POLITICS_PROMPT},
+            {"role": "system", "content": f"{ANSWER_PROMPT}\n\nPaper abstract: {self.abstract}"},
+        ]
+
+    def question_message(self, question):
+        if self.paper_index is None:
+            return {"role": "user", "content": f"Question: {question}"}
+        excerpts = self.paper_index.context(question, get_setting('Chat', 'TOP_K_CHUNKS', 4, int))
+        return {"role": "user", "content": f"Question: {question}\n\nRelevant excerpts from the paper:\n{excerpts}"}
+
+    def messages(self, question):
+        with self.lock:
+            messages = self.prefix()
+            if self.summary:
+                messages.append({"role": "system", "content": f"Summary of the conversation so far: {self.summary}"})
+            messages.extend(self.turns)
+        messages.append(self.question_message(question))
+        return messages
+
+    def add_turn(self, question, answer):
+        # Only the question is kept; excerpts are retrieved again for each new question
+        with self.lock:
+            self.turns.append({"role": "user", "content": question})
+            self.turns.append({"role": "assistant", "content": answer})
+
+    def compression_request(self):
+        # Once the verbatim history passes HISTORY_TOKENS, all but the last KEEP_TURNS exchanges are folded
+        # into the running summary. Returns (messages, number of turns they cover) or None.
+        keep = 2 * get_setting('Chat', 'KEEP_TURNS', 2, int)
+        with self.lock:
+            if len(self.turns) <= keep or count_message_tokens(self.turns) <= get_setting('Chat', 'HISTORY_TOKENS', 1500, int):
+                return None
+            older = self.turns[:len(self.turns) - keep]
+            transcript = "\n\n".join(f"{turn['role'].capitalize()}: {turn['content']}" for turn in older)
+            if self.summary:
+                transcript = f"Earlier summary: {self.summary}\n\n{transcript}"
+        messages = [
+            {"role": "system", "content": "You condense conversations about an academic paper. Keep every question asked, the facts given in the answers and any conclusions, in as few words as possible."},
+            {"role": "user", "content": f"Summarize this conversation about the paper:\n\n{transcript}"}
+        ]
+        return messages, len(older)
+
+    def compress(self, summary, turns):
+        with self.lock:
+            self.summary = summary
+            self.turns = self.turns[turns:]
+            self.compressed += turns
@@ -0,0 +1,267 @@
+import argparse
+import json
+import logging
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from metrics import start_exporters
+from settings import get_setting, set_config_path
+
+def write_token(token):
+    sys.stdout.write(token)
+    sys.stdout.flush()
+
+def print_json(value):
+    print(json.dumps(value, ensure_ascii=False))
+
+def search_options(args):
+    options = {}
+    if args.sort == 'newest':
+        options.update(sort_by='submittedDate', sort_order='descending')
+    elif args.sort == 'updated':
+        options.update(sort_by='lastUpdatedDate', sort_order='descending')
+    if args.date_from:
+        options['date_from'] = args.date_from
+    if args.date_to:
+        options['date_to'] = args.date_to
+    return options
+
+def lookup_papers(paper_ids):
+    from arxiv_utils import fetch_papers_by_id
+    papers = fetch_papers_by_id(paper_ids)
+    for paper_id in paper_ids:
+        if paper_id not in papers:
+            logging.error(f"Paper {paper_id} not found")
+    return [papers[paper_id] for paper_id in paper_ids if paper_id in papers]
+
+def cmd_search(args):
+    from arxiv_utils import fetch_arxiv_papers
+    papers = fetch_arxiv_papers(args.query, max_results=args.max_results, start=args.start, **search_options(args))
+    if papers is None:
+        return 1
+    print_papers(papers, args)
+    return 0
+
+def cmd_download(args):
+    from arxiv_utils import download_papers
+    papers = lookup_papers(args.ids)
+    results = download_papers(papers, max_workers=args.workers)
+    for paper in papers:
+        print(f"{paper['id']}  {results.get(paper['id']) or 'FAILED'}")
+    return 0 if len(papers) == len(args.ids) and all(results.values()) else 1
+
+def cmd_summarize(args):
+    from arxiv_utils import record_summary, summarize_full_paper, summarize_paper
+    status = 0
+    for paper in lookup_papers(args.ids):
+        on_token = None if args.json else write_token
+        if not args.json:
+            print(f"== {paper['id']}  {' '.join(paper['title'].split())}")
+        if args.full:
+            summary = summarize_full_paper(paper, on_token=on_token)
+        else:
+            summary = summarize_paper(paper['summary'], on_token=on_token, group=paper['id'])
+        record_summary(paper['id'], summary)
+        if summary.startswith("Error"):
+            status = 1
+        if args.json:
+            print_json({"id": paper['id'], "summary": summary})
+        else:
+            print()
+    return status
+
+def cmd_translate(args):
+    from arxiv_utils import translate_with_groq
+    text = args.text if args.text != '-' else sys.stdin.read()
+    translated = translate_with_groq(text, args.to, on_token=write_token)
+    print()
+    return 1 if translated.startswith("Error") else 0
+
+def cmd_ask(args):
+    from arxiv_utils import index_paper, load_chat_session, record_chat, talk_to_paper_with_groq
+    papers = lookup_papers([args.id])
+    if not papers:
+        return 1
+    paper = papers[0]
+    # Same session layout as the GUI, continuing any earlier chat about this paper
+    session, _ = load_chat_session(paper, index_paper(paper))
+    answer = talk_to_paper_with_groq(None, args.question, on_token=write_token, session=session)
+    print()
+    record_chat(paper['id'], args.question, answer)
+    return 1 if answer.startswith("Error") else 0
+
+def print_papers(papers, args):
+    for paper in papers:
+        if args.json:
+            print_json(paper)
+        else:
+            print(f"{paper['id']}  {paper['published_date']}  {' '.join(paper['title'].split())}")
+
+def cmd_watch(args):
+    from library import get_library
+    from watch import add_watch, find_watch, poll_watches, unique_papers
+    library = get_library()
+    sort_by = 'lastUpdatedDate' if args.updated else 'submittedDate'
+    if args.action in ('add', 'remove') and not args.target:
+        logging.error(f"watch {args.action} needs a query")
+        return 1
+    if args.action == 'add':
+        watch = add_watch(args.target, sort_by)
+        if watch['last_seen'] is None:
+            # The first poll records what exists now, so only later papers count as new
+            poll_watches([watch], summarize=False)
+        print(f"{watch['id']}  {watch['query']}")
+    elif args.action == 'remove':
+        watch = {'id': int(args.target)} if args.target.isdigit() else find_watch(args.target, sort_by)
+        if watch is None:
+            logging.error(f"No watch for {args.target!r}")
+            return 1
+        library.remove_watch(watch['id'])
+    elif args.action == 'list':
+        for watch in library.watches():
+            checked = time.strftime('%Y-%m-%d %H:%M', time.localtime(watch['last_checked'])) if watch['last_checked'] else 'never'
+            print(f"{watch['id']}  {watch['query']}  [{watch['sort_by']}]  last seen {watch['last_seen'] or '-'}, "
+                  f"checked {checked}, {watch['unseen']} new")
+    elif args.action == 'poll':
+        # Suited to cron: only the watches due per [Watch] INTERVAL_MINUTES are polled unless --all
+        print_papers(unique_papers(poll_watches(force=args.all, summarize=not args.no_summarize)), args)
+    elif args.action == 'new':
+        papers = library.watch_papers(int(args.target) if args.target else None, unseen_only=True)
+        print_papers(papers, args)
+        library.mark_watch_papers_seen([paper['id'] for paper in papers])
+    return 0
+
+def process_batch_item(line, args):
+    # One input line: an arXiv ID, or a query whose top results are processed
+    from arxiv_utils import (
+        download_paper,
+        fetch_arxiv_papers,
+        fetch_papers_by_id,
+        is_arxiv_id,
+        record_summary,
+        summarize_full_paper,
+        summarize_paper,
+    )
+    from scheduler import BATCH
+    if is_arxiv_id(line):
+        papers = list(fetch_papers_by_id([line]).values())
+    else:
+        papers = fetch_arxiv_papers(line, max_results=args.max_results) or []
+    if not papers:
+        return {"input": line, "error": "No papers found"}
+    results = []
+    for paper in papers:
+        result = dict(paper)
+        if args.task == 'download':
+            result['pdf_path'] = download_paper(paper['pdf_url'], paper['id'])
+        elif args.task == 'summarize':
+            if args.full:
+                summary = summarize_full_paper(paper, priority=BATCH)
+            else:
+                summary = summarize_paper(paper['summary'], priority=BATCH, group='batch')
+            record_summary(paper['id'], summary)
+            result['generated_summary'] = summary
+        results.append(result)
+    return {"input": line, "papers": results}
+
+def cmd_batch(args):
+    from scheduler import scheduler_stats
+    source = sys.stdin if args.input == '-' else open(args.input, encoding='utf-8')
+    with source:
+        lines = [line.strip() for line in source if line.strip() and not line.startswith('#')]
+    output = sys.stdout if args.output == '-' else open(args.output, 'w', encoding='utf-8')
+    workers = args.workers or get_setting('Batch', 'SUMMARY_WORKERS', 4, int)
+    write_lock = threading.Lock()
+    failures = 0
+    start = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(process_batch_item, line, args): (number, line) for number, line in enumerate(lines, 1)}
+            # Results are written as they complete; "line" gives the position in the input
+            for future in as_completed(futures):
+                number, line = futures[future]
+                try:
+                    record = future.result()
+                except Exception as e:
+                    logging.exception(f"Batch item {line!r} failed")
+                    record = {"input": line, "error": str(e)}
+                record["line"] = number
+                failures += "error" in record
+                with write_lock:
+                    output.write(json.dumps(record, ensure_ascii=False) + "\n")
+                    output.flush()
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    logging.info(f"Processed {len(lines)} items with {workers} workers in {time.perf_counter() - start:.1f}s, {failures} failed")
+    logging.info(f"Scheduler stats: {scheduler_stats()}")
+    return 1 if failures else 0
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="garx", description="Search, download, summarize and chat with arXiv papers from the command line")
+    parser.add_argument('--config', help="path to key.ini (default: ./key.ini or $GARX_CONFIG)")
+    parser.add_argument('-v', '--verbose', action='store_true', help="log progress to stderr")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    search = commands.add_parser('search', help="search arXiv")
+    search.add_argument('query')
+    search.add_argument('-n', '--max-results', type=int, default=10)
+    search.add_argument('--start', type=int, default=0)
+    search.add_argument('--sort', choices=('relevance', 'newest', 'updated'), default='relevance')
+    search.add_argument('--from', dest='date_from', help="submitted on or after YYYY-MM-DD")
+    search.add_argument('--to', dest='date_to', help="submitted on or before YYYY-MM-DD")
+    search.add_argument('--json', action='store_true', help="print one JSON record per paper")
+    search.set_defaults(func=cmd_search)
+
+    download = commands.add_parser('download', help="download PDFs by arXiv ID")
+    download.add_argument('ids', nargs='+')
+    download.add_argument('-w', '--workers', type=int)
+    download.set_defaults(func=cmd_download)
+
+    summarize = commands.add_parser('summarize', help="summarize papers by arXiv ID")
+    summarize.add_argument('ids', nargs='+')
+    summarize.add_argument('--full', action='store_true', help="summarize the full text instead of the abstract")
+    summarize.add_argument('--json', action='store_true')
+    summarize.set_defaults(func=cmd_summarize)
+
+    translate = commands.add_parser('translate', help="translate text ('-' reads stdin)")
+    translate.add_argument('text')
+    translate.add_argument('--to', default='en', help="target language")
+    translate.set_defaults(func=cmd_translate)
+
+    ask = commands.add_parser('ask', help="ask a question about a paper")
+    ask.add_argument('id')
+    ask.add_argument('question')
+    ask.set_defaults(func=cmd_ask)
+
+    batch = commands.add_parser('batch', help="process a file of queries or arXiv IDs into JSONL")
+    batch.add_argument('input', help="one query or arXiv ID per line ('-' reads stdin)")
+    batch.add_argument('-o', '--output', default='-', help="JSONL output file (default: stdout)")
+    batch.add_argument('-t', '--task', choices=('search', 'download', 'summarize'), default='summarize')
+    batch.add_argument('-n', '--max-results', type=int, default=5, help="papers per query")
+    batch.add_argument('-w', '--workers', type=int, help="items processed concurrently (default: [Batch] SUMMARY_WORKERS)")
+    batch.add_argument('--full', action='store_true', help="summarize full texts instead of abstracts")
+    batch.set_defaults(func=cmd_batch)
+
+    watch = commands.add_parser('watch', help="saved queries polled for new papers")
+    watch.add_argument('action', choices=('add', 'remove', 'list', 'poll', 'new'))
+    watch.add_argument('target', nargs='?', help="query for add/remove (or watch ID for remove/new)")
+    watch.add_argument('--updated', action='store_true', help="follow updated versions too, not only new submissions")
+    watch.add_argument('--all', action='store_true', help="poll every watch, not only those due")
+    watch.add_argument('--no-summarize', action='store_true', help="don't summarize new papers")
+    watch.add_argument('--json', action='store_true', help="print one JSON record per paper")
+    watch.set_defaults(func=cmd_watch)
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING,
+                        format='%(asctime)s - %(levelname)s - %(message)s', stream=sys.stderr)
+    if args.config:
+        set_config_path(args.config)
+    start_exporters()
+    return args.func(args)
+
+if __name__ == '__main__':
+    sys.exit(main())
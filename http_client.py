@@ -0,0 +1,66 @@
+import logging
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import metrics
+from settings import get_setting
+
+# Statuses worth retrying: rate limiting and transient server errors
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+_sessions = {}
+_session_lock = threading.Lock()
+
+metrics.register_timeout_error(requests.exceptions.Timeout)
+
+class CountingRetry(Retry):
+    # Counts every retry urllib3 makes on our behalf
+    def increment(self, method=None, url=None, response=None, error=None, *args, **kwargs):
+        reason = response.status if response is not None else type(error).__name__
+        metrics.inc('garx_http_retries_total', client='requests', reason=reason)
+        return super().increment(method, url, response, error, *args, **kwargs)
+
+def build_session(pool_connections=10, pool_maxsize=10, max_retries=3, backoff_factor=0.5):
+    # Retry-After is honoured for 429/503; other statuses back off exponentially. With max_retries=0
+    # errors and statuses go straight back to the caller.
+    retry = CountingRetry(
+        total=max_retries,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=None,
+        backoff_factor=backoff_factor,
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    ) if max_retries else 0
+    # One urllib3 pool per host, each keeping up to pool_maxsize idle keep-alive connections
+    adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=retry)
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+def get_session(retries=True):
+    # retries=False is for requests with somewhere else to go, e.g. an LLM backend with a fallback,
+    # so that their timeout bounds the whole attempt
+    if retries not in _sessions:
+        with _session_lock:
+            if retries not in _sessions:
+                _sessions[retries] = build_session(
+                    pool_connections=get_setting('HTTP', 'POOL_CONNECTIONS', 10, int),
+                    pool_maxsize=get_setting('HTTP', 'POOL_MAXSIZE', 10, int),
+                    max_retries=get_setting('HTTP', 'MAX_RETRIES', 3, int) if retries else 0,
+                    backoff_factor=get_setting('HTTP', 'BACKOFF_FACTOR', 0.5, float),
+                )
+                logging.info(f"Initialized shared HTTP session{'' if retries else ' without retries'}")
+    return _sessions[retries]
+
+def default_timeout():
+    return (get_setting('HTTP', 'CONNECT_TIMEOUT', 5, float), get_setting('HTTP', 'READ_TIMEOUT', 30, float))
+
+def get(url, **kwargs):
+    kwargs.setdefault('timeout', default_timeout())
+    return get_session().get(url, **kwargs)
+
+def post(url, retries=True, **kwargs):
+    kwargs.setdefault('timeout', default_timeout())
+    return get_session(retries).post(url, **kwargs)
@@ -0,0 +1,319 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from settings import get_setting
+
+_library = None
+_library_lock = threading.Lock()
+
+PAPER_FIELDS = ('id', 'title', 'summary', 'pdf_url', 'published_date', 'updated_date',
+                'authors', 'categories', 'primary_category', 'doi', 'version')
+JSON_FIELDS = ('authors', 'categories')
+
+def fts_query(text):
+    # Quote every term so user input can't trip FTS5 syntax (hyphens, colons, quotes); terms are ANDed
+    return " ".join('"' + term.replace('"', '""') + '"' for term in text.split())
+
+class Library:
+    # Local record of every paper seen, with its PDF, full text, summaries and chat transcripts
+    def __init__(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS papers ("
+            "id TEXT PRIMARY KEY, title TEXT, summary TEXT, pdf_url TEXT, published_date TEXT, updated_date TEXT, "
+            "authors TEXT, categories TEXT, primary_category TEXT, doi TEXT, version INTEGER, "
+            "pdf_path TEXT, full_text TEXT, first_seen REAL NOT NULL, last_seen REAL NOT NULL, last_opened REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS papers_last_opened ON papers (last_opened)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS summaries ("
+            "paper_id TEXT NOT NULL REFERENCES papers (id) ON DELETE CASCADE, summary TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS summaries_paper_id ON summaries (paper_id, created_at)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chat_messages ("
+            "paper_id TEXT NOT NULL REFERENCES papers (id) ON DELETE CASCADE, role TEXT NOT NULL, "
+            "content TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS chat_messages_paper_id ON chat_messages (paper_id, created_at)")
+        # Running summary of a paper's chat, covering its first `messages` chat messages
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chat_summaries ("
+            "paper_id TEXT PRIMARY KEY REFERENCES papers (id) ON DELETE CASCADE, summary TEXT NOT NULL, "
+            "messages INTEGER NOT NULL, updated_at REAL NOT NULL)"
+        )
+        # Saved queries polled for new papers; last_seen is the newest submission (or update) date found so far
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS watches ("
+            "id INTEGER PRIMARY KEY, query TEXT NOT NULL, sort_by TEXT NOT NULL, last_seen TEXT, last_checked REAL, "
+            "created_at REAL NOT NULL, UNIQUE (query, sort_by))"
+        )
+        # Papers each watch has found, keyed by arXiv ID (with the version when watching updates)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS watch_papers ("
+            "watch_id INTEGER NOT NULL REFERENCES watches (id) ON DELETE CASCADE, paper_key TEXT NOT NULL, "
+            "paper_id TEXT NOT NULL, found_at REAL NOT NULL, seen INTEGER NOT NULL DEFAULT 0, PRIMARY KEY (watch_id, paper_key))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS watch_papers_seen ON watch_papers (seen, found_at)")
+        self._create_fts()
+        self._conn.commit()
+
+    def _create_fts(self):
+        # Titles, abstracts and full text are searchable offline. The index reads its text from papers
+        # (keyed by rowid) and triggers keep it in step, touching it only when an indexed column changes.
+        row = self._conn.execute("SELECT sql FROM sqlite_master WHERE name = 'papers_fts'").fetchone()
+        rebuild = row is None or "content=" not in row[0]
+        if row is not None and rebuild:
+            # Libraries from before the index was external-content kept their own copy of the text
+            self._conn.execute("DROP TABLE papers_fts")
+        self._conn.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS papers_fts USING fts5("
+            "title, summary, full_text, content='papers', content_rowid='rowid', tokenize='porter unicode61')"
+        )
+        self._conn.execute(
+            "CREATE TRIGGER IF NOT EXISTS papers_fts_insert AFTER INSERT ON papers BEGIN "
+            "INSERT INTO papers_fts (rowid, title, summary, full_text) VALUES (new.rowid, new.title, new.summary, new.full_text); END"
+        )
+        self._conn.execute(
+            "CREATE TRIGGER IF NOT EXISTS papers_fts_delete AFTER DELETE ON papers BEGIN "
+            "INSERT INTO papers_fts (papers_fts, rowid, title, summary, full_text) "
+            "VALUES ('delete', old.rowid, old.title, old.summary, old.full_text); END"
+        )
+        self._conn.execute(
+            "CREATE TRIGGER IF NOT EXISTS papers_fts_update AFTER UPDATE OF title, summary, full_text ON papers "
+            "WHEN old.title IS NOT new.title OR old.summary IS NOT new.summary OR old.full_text IS NOT new.full_text BEGIN "
+            "INSERT INTO papers_fts (papers_fts, rowid, title, summary, full_text) "
+            "VALUES ('delete', old.rowid, old.title, old.summary, old.full_text); "
+            "INSERT INTO papers_fts (rowid, title, summary, full_text) VALUES (new.rowid, new.title, new.summary, new.full_text); END"
+        )
+        if rebuild:
+            self._conn.execute("INSERT INTO papers_fts (papers_fts) VALUES ('rebuild')")
+
+    def _paper(self, row):
+        paper = {field: row[field] for field in PAPER_FIELDS}
+        for field in JSON_FIELDS:
+            paper[field] = json.loads(paper[field]) if paper[field] else []
+        paper['pdf_path'] = row['pdf_path']
+        return paper
+
+    def add_papers(self, papers):
+        # Metadata is refreshed on every sighting; stored PDFs, text and history are kept
+        now = time.time()
+        rows = []
+        for paper in papers:
+            row = [paper.get(field) for field in PAPER_FIELDS]
+            for field in JSON_FIELDS:
+                index = PAPER_FIELDS.index(field)
+                row[index] = json.dumps(row[index] or [])
+            rows.append(row + [now, now])
+        if not rows:
+            return
+        columns = ", ".join(PAPER_FIELDS)
+        updates = ", ".join(f"{field} = excluded.{field}" for field in PAPER_FIELDS[1:])
+        with self._lock:
+            self._conn.executemany(
+                f"INSERT INTO papers ({columns}, first_seen, last_seen) VALUES ({', '.join('?' * (len(PAPER_FIELDS) + 2))}) "
+                f"ON CONFLICT (id) DO UPDATE SET {updates}, last_seen = excluded.last_seen",
+                rows,
+            )
+            self._conn.commit()
+
+    def get_paper(self, paper_id):
+        # An ID without a version matches the latest version seen
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM papers WHERE id = ? OR id LIKE ? ORDER BY id = ? DESC, version DESC LIMIT 1",
+                (paper_id, paper_id + 'v%', paper_id),
+            ).fetchone()
+        return self._paper(row) if row is not None else None
+
+    def mark_opened(self, paper_id):
+        with self._lock:
+            self._conn.execute("UPDATE papers SET last_opened = ? WHERE id = ?", (time.time(), paper_id))
+            self._conn.commit()
+
+    def history(self, limit=50):
+        # Papers the user has opened, most recent first
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM papers WHERE last_opened IS NOT NULL ORDER BY last_opened DESC LIMIT ?", (limit,)
+            ).fetchall()
+        return [self._paper(row) for row in rows]
+
+    def set_pdf_path(self, paper_id, pdf_path):
+        with self._lock:
+            self._conn.execute("UPDATE papers SET pdf_path = ? WHERE id = ?", (pdf_path, paper_id))
+            self._conn.commit()
+
+    def set_full_text(self, paper_id, text, pdf_path=None):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE papers SET full_text = ?, pdf_path = COALESCE(?, pdf_path) WHERE id = ?", (text, pdf_path, paper_id)
+            )
+            self._conn.commit()
+
+    def full_text(self, paper_id):
+        with self._lock:
+            row = self._conn.execute("SELECT full_text FROM papers WHERE id = ?", (paper_id,)).fetchone()
+        return row[0] if row is not None else None
+
+    def add_summary(self, paper_id, summary):
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO summaries (paper_id, summary, created_at) VALUES (?, ?, ?)", (paper_id, summary, time.time())
+            )
+            self._conn.commit()
+
+    def latest_summary(self, paper_id):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT summary FROM summaries WHERE paper_id = ? ORDER BY created_at DESC LIMIT 1", (paper_id,)
+            ).fetchone()
+        return row[0] if row is not None else None
+
+    def add_chat_message(self, paper_id, role, content):
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO chat_messages (paper_id, role, content, created_at) VALUES (?, ?, ?, ?)",
+                (paper_id, role, content, time.time()),
+            )
+            self._conn.commit()
+
+    def chat_transcript(self, paper_id):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT role, content FROM chat_messages WHERE paper_id = ? ORDER BY created_at, rowid", (paper_id,)
+            ).fetchall()
+        return [{"role": row[0], "content": row[1]} for row in rows]
+
+    def set_chat_summary(self, paper_id, summary, messages):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO chat_summaries (paper_id, summary, messages, updated_at) VALUES (?, ?, ?, ?)",
+                (paper_id, summary, messages, time.time()),
+            )
+            self._conn.commit()
+
+    def chat_summary(self, paper_id):
+        # Returns (summary, number of chat messages it covers); (None, 0) before the chat was first compressed
+        with self._lock:
+            row = self._conn.execute("SELECT summary, messages FROM chat_summaries WHERE paper_id = ?", (paper_id,)).fetchone()
+        return (row[0], row[1]) if row is not None else (None, 0)
+
+    def add_watch(self, query, sort_by):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO watches (query, sort_by, created_at) VALUES (?, ?, ?)", (query, sort_by, time.time())
+            )
+            self._conn.commit()
+            row = self._conn.execute("SELECT * FROM watches WHERE query = ? AND sort_by = ?", (query, sort_by)).fetchone()
+        return dict(row)
+
+    def find_watch(self, query, sort_by):
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM watches WHERE query = ? AND sort_by = ?", (query, sort_by)).fetchone()
+        return dict(row) if row is not None else None
+
+    def remove_watch(self, watch_id):
+        with self._lock:
+            self._conn.execute("DELETE FROM watches WHERE id = ?", (watch_id,))
+            self._conn.commit()
+
+    def watches(self):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT watches.*, (SELECT COUNT(*) FROM watch_papers WHERE watch_id = watches.id AND seen = 0) AS unseen "
+                "FROM watches ORDER BY id"
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def add_watch_papers(self, watch_id, papers, seen=False):
+        # papers: (key, paper ID) pairs; returns the IDs the watch hadn't found before
+        now = time.time()
+        added = []
+        with self._lock:
+            for key, paper_id in papers:
+                cursor = self._conn.execute(
+                    "INSERT OR IGNORE INTO watch_papers (watch_id, paper_key, paper_id, found_at, seen) VALUES (?, ?, ?, ?, ?)",
+                    (watch_id, key, paper_id, now, int(seen)),
+                )
+                if cursor.rowcount:
+                    added.append(paper_id)
+            self._conn.commit()
+        return added
+
+    def update_watch(self, watch_id, last_seen, last_checked):
+        with self._lock:
+            self._conn.execute("UPDATE watches SET last_seen = ?, last_checked = ? WHERE id = ?", (last_seen, last_checked, watch_id))
+            self._conn.commit()
+
+    def watch_papers(self, watch_id=None, unseen_only=False, limit=100):
+        # Newest finds first, across all watches unless watch_id is given
+        conditions, params = [], []
+        if watch_id is not None:
+            conditions.append("watch_papers.watch_id = ?")
+            params.append(watch_id)
+        if unseen_only:
+            conditions.append("watch_papers.seen = 0")
+        where = f"WHERE {' AND '.join(conditions)} " if conditions else ""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT papers.* FROM watch_papers JOIN papers ON papers.id = watch_papers.paper_id "
+                f"{where}GROUP BY papers.id ORDER BY MAX(watch_papers.found_at) DESC, papers.published_date DESC LIMIT ?",
+                params + [limit],
+            ).fetchall()
+        return [self._paper(row) for row in rows]
+
+    def mark_watch_papers_seen(self, paper_ids):
+        with self._lock:
+            self._conn.executemany("UPDATE watch_papers SET seen = 1 WHERE paper_id = ?", [(paper_id,) for paper_id in paper_ids])
+            self._conn.commit()
+
+    def search(self, query, limit=20):
+        # Ranked offline search; title matches weigh more than abstract and full-text matches
+        match = fts_query(query)
+        if not match:
+            return []
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT papers.*, snippet(papers_fts, -1, '[', ']', '...', 12) AS snippet FROM papers_fts "
+                "JOIN papers ON papers.rowid = papers_fts.rowid WHERE papers_fts MATCH ? "
+                "ORDER BY bm25(papers_fts, 10.0, 4.0, 1.0) LIMIT ?",
+                (match, limit),
+            ).fetchall()
+        papers = []
+        for row in rows:
+            paper = self._paper(row)
+            paper['snippet'] = row['snippet']
+            papers.append(paper)
+        return papers
+
+    def stats(self):
+        with self._lock:
+            return {
+                'papers': self._conn.execute("SELECT COUNT(*) FROM papers").fetchone()[0],
+                'with_text': self._conn.execute("SELECT COUNT(*) FROM papers WHERE full_text IS NOT NULL").fetchone()[0],
+                'summaries': self._conn.execute("SELECT COUNT(*) FROM summaries").fetchone()[0],
+                'chat_messages': self._conn.execute("SELECT COUNT(*) FROM chat_messages").fetchone()[0],
+            }
+
+def get_library():
+    global _library
+    if _library is None:
+        with _library_lock:
+            if _library is None:
+                path = get_setting('Library', 'LIBRARY_PATH', 'garx_library.sqlite3')
+                _library = Library(path)
+                logging.info(f"Opened paper library {path}")
+    return _library
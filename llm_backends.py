@@ -0,0 +1,93 @@
+import logging
+import threading
+from settings import get_config, get_setting
+
+# Tasks that can be routed to their own backend and model
+TASKS = ('summary', 'polish', 'translate', 'chat', 'compress')
+DEFAULT_BACKEND = 'Groq'
+
+_backends = {}
+_backends_lock = threading.Lock()
+_reported = set()
+
+class BackendError(Exception):
+    # A backend named in [Routing] that the config doesn't define properly
+    pass
+
+class Backend:
+    # An OpenAI-compatible chat completions endpoint: Groq, OpenAI, or a local llama.cpp/Ollama server.
+    # name is its key.ini section, which also keys its rate limiter and scheduler.
+    def __init__(self, name, api_base, api_key=None, model=None, task_models=None, timeout=None):
+        self.name = name
+        self.api_base = api_base.rstrip('/')
+        self.api_key = api_key
+        self.model = model
+        self.task_models = task_models or {}
+        self.timeout = timeout
+
+    @property
+    def url(self):
+        return f"{self.api_base}/chat/completions"
+
+    def model_for(self, task):
+        return self.task_models.get(task) or self.model
+
+    def headers(self):
+        headers = {"Content-Type": "application/json"}
+        # Local servers usually run without a key
+        if self.api_key:
+            headers["Authorization"] = f"Bearer {self.api_key}"
+        return headers
+
+    def payload(self, model, messages, max_tokens, stream=False):
+        data = {
+            "model": model,
+            "messages": messages,
+            "max_tokens": max_tokens
+        }
+        if stream:
+            data["stream"] = True
+        return data
+
+def load_backend(name):
+    config = get_config()
+    if not config.has_section(name):
+        raise BackendError(f"No [{name}] section in the config for this backend")
+    section = config[name]
+    if not section.get('API_BASE'):
+        raise BackendError(f"No API_BASE in the [{name}] section of the config")
+    # [Groq] predates the generic MODEL key
+    model = section.get('MODEL') or section.get('GROQ_MODEL')
+    task_models = {task: section[f'{task.upper()}_MODEL'] for task in TASKS if section.get(f'{task.upper()}_MODEL')}
+    timeout = section.getfloat('TIMEOUT') if section.get('TIMEOUT') else None
+    return Backend(name, section['API_BASE'], section.get('API_KEY'), model, task_models, timeout)
+
+def get_backend(name):
+    if name not in _backends:
+        with _backends_lock:
+            if name not in _backends:
+                _backends[name] = load_backend(name)
+    return _backends[name]
+
+def task_routes(task):
+    # (backend, model) pairs to try in order: the task's backend from [Routing], then the fallbacks
+    names = [get_setting('Routing', task.upper(), DEFAULT_BACKEND)]
+    fallbacks = get_setting('Routing', f'{task.upper()}_FALLBACK', get_setting('Routing', 'FALLBACK', ''))
+    names += [name.strip() for name in fallbacks.split(',') if name.strip() and name.strip() not in names]
+    routes = []
+    for name in names:
+        try:
+            backend = get_backend(name)
+        except BackendError as e:
+            # A misconfigured backend is skipped, and reported once rather than on every call
+            if name not in _reported:
+                _reported.add(name)
+                logging.error(f"Skipping backend {name}: {e}")
+            continue
+        routes.append((backend, backend.model_for(task)))
+    if not routes:
+        raise BackendError(f"No usable backend for {task}; check [Routing] in the config")
+    return routes
+
+def task_model(task):
+    return task_routes(task)[0][1]
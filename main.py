@@ -1,6 +1,5 @@
 import sys
 import os
-import configparser
 from PyQt5.QtWidgets import (
     QApplication,
     QWidget,
@@ -9,21 +8,26 @@ from PyQt5.QtWidgets import (
     QLabel,
     QPushButton,
     QLineEdit,
-    QListWidget,
+    QListView,
     QTextEdit,
     QMessageBox,
     QComboBox,
     QDialog,
-    QScrollArea,
-    QListWidgetItem,
     QMainWindow,
 )
-from PyQt5.QtCore import QThread, pyqtSignal, Qt, QUrl
-from PyQt5.QtGui import QIcon
-from PyQt5.QtWebEngineWidgets import QWebEngineView
-from arxiv_utils import fetch_arxiv_papers, summarize_paper, translate_with_groq, talk_to_paper_with_groq, download_paper
+from PyQt5.QtCore import QAbstractListModel, QModelIndex, Qt, QTimer, QUrl, pyqtSignal
+from PyQt5.QtGui import QColor, QIcon, QTextCharFormat, QTextCursor, QTextFrameFormat
+from cache import cache_stats
+from library import get_library
+from metrics import start_exporters
+from qt_async import AsyncRunner
+from scheduler import cancel_requests, promote_requests, scheduler_stats
+from settings import get_setting
 import logging
 
+# How often the window checks for due watches
+WATCH_CHECK_MS = 60 * 1000
+
 # Apply dark mode and blue accent styling
 style = """
 QWidget {
@@ -46,28 +50,128 @@ QPushButton {
 QPushButton:hover {
     background-color: #0056b3; /* Darker blue on hover */
 }
-QListWidget {
+QListView {
     background-color: #3E3E3E;
     border: 1px solid #1E1E1E;
 }
-QScrollArea {
-    border: none;
-}
 QLabel {
     font-size: 12pt;
 }
 """
 
-class ProcessingThread(QThread):
-    finished = pyqtSignal(str, str)
+def append_text(text_edit, text):
+    # Append streamed tokens at the end without re-setting the whole document
+    cursor = text_edit.textCursor()
+    cursor.movePosition(QTextCursor.End)
+    cursor.insertText(text)
+    text_edit.setTextCursor(cursor)
 
-    def __init__(self, paper):
-        QThread.__init__(self)
-        self.paper = paper
+class PaperListModel(QAbstractListModel):
+    # Search results loaded one page at a time as the view scrolls
+    page_loaded = pyqtSignal(int, int)  # start offset, number of papers received
+    page_cancelled = pyqtSignal()  # a page in flight was dropped and page_loaded won't follow
 
-    def run(self):
-        summary = summarize_paper(self.paper["summary"])
-        self.finished.emit(summary, self.paper["summary"])
+    def __init__(self, runner, parent=None):
+        super().__init__(parent)
+        self.runner = runner
+        self.papers = []
+        self.rows = {}
+        self.summaries = {}
+        self.query = None
+        self.page_size = 5
+        self.filters = {}
+        self.next_start = 0
+        self.exhausted = True
+        self.loading = False
+        self.failed = False
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.papers)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        paper = self.papers[index.row()]
+        if role == Qt.DisplayRole:
+            mark = "\u2713 " if paper['id'] in self.summaries else ""
+            return f"{mark}{paper['title']}\nID: {paper['id']} | Date: {paper['published_date']} | Authors: {', '.join(paper['authors'])}"
+        if role == Qt.ToolTipRole:
+            return self.summaries.get(paper['id'])
+        if role == Qt.UserRole:
+            return paper
+        return None
+
+    def search(self, query, page_size, **filters):
+        self.beginResetModel()
+        self.papers = []
+        self.rows = {}
+        self.summaries = {}
+        self.endResetModel()
+        self.query = query
+        self.page_size = page_size
+        self.filters = filters
+        self.next_start = 0
+        self.exhausted = False
+        self.loading = False
+        self.failed = False
+        self.fetch_next_page()
+
+    def show_papers(self, papers):
+        # Results from the local library arrive complete, nothing more to fetch
+        self.runner.cancel('search_page')
+        if self.loading:
+            self.page_cancelled.emit()
+        self.beginResetModel()
+        self.papers = list(papers)
+        self.rows = {paper['id']: row for row, paper in enumerate(self.papers)}
+        self.summaries = {}
+        self.endResetModel()
+        self.query = None
+        self.exhausted = True
+        self.loading = False
+        self.failed = False
+
+    def canFetchMore(self, parent=QModelIndex()):
+        # After a failed page the view's layout passes must not keep re-requesting it
+        return not parent.isValid() and not self.exhausted and not self.loading and not self.failed
+
+    def fetchMore(self, parent=QModelIndex()):
+        self.fetch_next_page()
+
+    def fetch_next_page(self, retry=False):
+        # A failed page is only requested again when retry is set, i.e. when the user asks for it
+        if self.exhausted or self.loading or (self.failed and not retry):
+            return
+        self.loading = True
+        self.failed = False
+        start = self.next_start
+        from async_client import fetch_arxiv_papers_async
+        self.runner.submit(fetch_arxiv_papers_async(self.query, max_results=self.page_size, start=start, **self.filters),
+                           lambda papers: self.on_page(start, papers), lambda error: self.on_page(start, None), key='search_page')
+
+    def on_page(self, start, papers):
+        self.loading = False
+        self.failed = papers is None
+        if papers is not None:
+            self.next_start = start + len(papers)
+            if len(papers) < self.page_size:
+                self.exhausted = True
+        # Pages can overlap when new papers are published in between requests
+        papers = [paper for paper in papers or [] if paper['id'] not in self.rows]
+        if papers:
+            first = len(self.papers)
+            self.beginInsertRows(QModelIndex(), first, first + len(papers) - 1)
+            for row, paper in enumerate(papers, first):
+                self.rows[paper['id']] = row
+            self.papers.extend(papers)
+            self.endInsertRows()
+        self.page_loaded.emit(start, len(papers))
+
+    def set_summary(self, paper_id, summary):
+        self.summaries[paper_id] = summary
+        row = self.rows.get(paper_id)
+        if row is not None:
+            self.dataChanged.emit(self.index(row), self.index(row))
 
 class PDFViewer(QMainWindow):
     def __init__(self, pdf_path):
@@ -75,32 +179,18 @@ class PDFViewer(QMainWindow):
         self.setWindowTitle("PDF Viewer")
         self.setGeometry(100, 100, 800, 600)
 
+        # QtWebEngine starts a Chromium process; it is only loaded once a PDF is previewed
+        from PyQt5.QtWebEngineWidgets import QWebEngineView
         self.web_view = QWebEngineView()
         self.setCentralWidget(self.web_view)
 
         pdf_url = QUrl.fromLocalFile(pdf_path)
         self.web_view.setUrl(pdf_url)
 
-class ChatThread(QThread):
-    finished = pyqtSignal(str)
-
-    def __init__(self, paper_text, question, use_groq=False):
-        super().__init__()
-        self.paper_text = paper_text
-        self.question = question
-        self.use_groq = use_groq
-
-    def run(self):
-        if self.use_groq:
-            answer = talk_to_paper_with_groq(self.paper_text, self.question)
-        else:
-            answer = "Error: Unsupported chat method"
-        
-        self.finished.emit(answer)
-
 class TranslationWindow(QDialog):
-    def __init__(self, parent=None):
+    def __init__(self, runner, parent=None):
         super().__init__(parent)
+        self.runner = runner
         self.setWindowTitle("Translation")
         self.setGeometry(350, 350, 600, 400)
         self.initUI()
@@ -132,42 +222,117 @@ class TranslationWindow(QDialog):
     def translate_text(self):
         target_language = self.lang_combo.currentText()
         self.translation_area.setText("Translating... Please wait.")
-        translated_text = translate_with_groq(self.original_text, target_language)
+        self.translate_btn.setEnabled(False)
+        self.streaming = False
+
+        task = self.runner.task('translate')
+        from async_client import translate_with_groq_async
+        task.run(translate_with_groq_async(self.original_text, target_language, on_token=task.post(self.on_translation_token)),
+                 self.on_translation_finished)
+
+    def on_translation_token(self, token):
+        if not self.streaming:
+            self.translation_area.clear()
+            self.streaming = True
+        append_text(self.translation_area, token)
+
+    def on_translation_finished(self, translated_text):
         self.translation_area.setText(translated_text)
+        self.translate_btn.setEnabled(True)
+
+class ChatMessage:
+    # A message in the chat pane, edited in place while its answer streams in
+    def __init__(self, view, frame):
+        self.view = view
+        self.frame = frame
+
+    def set_text(self, text):
+        cursor = self.frame.firstCursorPosition()
+        cursor.setPosition(self.frame.lastPosition(), QTextCursor.KeepAnchor)
+        self.view.insert_text(cursor, text)
 
-class ChatBubble(QWidget):
-    def __init__(self, text, is_user=True, parent=None):
+    def append_text(self, text):
+        self.view.insert_text(self.frame.lastCursorPosition(), text)
+
+class ChatView(QTextEdit):
+    # The whole conversation is one document with a frame per message: only the visible part is painted,
+    # and a streamed token relays out just the message it extends instead of the whole pane
+    def __init__(self, parent=None):
         super().__init__(parent)
-        layout = QHBoxLayout()
-        bubble = QLabel(text)
-        bubble.setWordWrap(True)
-        bubble.setStyleSheet(
-            "background-color: #007BFF;" if is_user else "#E0E0E0;"
-            "border-radius: 10px; padding: 10px; color: black;"
-        )
+        self.setReadOnly(True)
+        self.text_format = QTextCharFormat()
+        self.text_format.setForeground(QColor("black"))
+        self.reset()
+
+    def reset(self):
+        self.clear()
+        # Every streamed token would otherwise be kept as an undo step
+        self.document().setUndoRedoEnabled(False)
+
+    def message_format(self, is_user):
+        frame_format = QTextFrameFormat()
+        frame_format.setBackground(QColor("#007BFF" if is_user else "#E0E0E0"))
+        frame_format.setPadding(10)
+        frame_format.setTopMargin(5)
+        frame_format.setBottomMargin(5)
+        # User messages sit on the right, answers on the left
         if is_user:
-            layout.addStretch()
-        layout.addWidget(bubble)
-        if not is_user:
-            layout.addStretch()
-        self.setLayout(layout)
-
-class ArxivApp(QWidget):
-    def __init__(self):
-        super().__init__()
-        self.config = configparser.ConfigParser()
-        self.config.read('key.ini')
-        self.translation_window = TranslationWindow(self)
-        self.pdf_viewer = None  # Initialize pdf_viewer as None
-        self.initUI()
+            frame_format.setLeftMargin(60)
+        else:
+            frame_format.setRightMargin(60)
+        return frame_format
+
+    def _insert_message(self, cursor, text, is_user):
+        cursor.movePosition(QTextCursor.End)
+        frame = cursor.insertFrame(self.message_format(is_user))
+        cursor.insertText(text, self.text_format)
+        return ChatMessage(self, frame)
+
+    def add_message(self, text, is_user):
+        message = self._insert_message(QTextCursor(self.document()), text, is_user)
+        self.scroll_to_bottom()
+        return message
+
+    def set_messages(self, messages):
+        # (text, is_user) pairs, laid out once at the end however long the history is
+        self.reset()
+        cursor = QTextCursor(self.document())
+        cursor.beginEditBlock()
+        for text, is_user in messages:
+            self._insert_message(cursor, text, is_user)
+        cursor.endEditBlock()
+        self.scroll_to_bottom()
+
+    def insert_text(self, cursor, text):
+        # Follows the answer only while the user hasn't scrolled up to read earlier messages
+        scroll_bar = self.verticalScrollBar()
+        at_bottom = scroll_bar.value() >= scroll_bar.maximum() - 4
+        cursor.insertText(text, self.text_format)
+        if at_bottom:
+            self.scroll_to_bottom()
+
+    def scroll_to_bottom(self):
+        self.verticalScrollBar().setValue(self.verticalScrollBar().maximum())
 
 class ArxivApp(QWidget):
     def __init__(self):
         super().__init__()
-        self.config = configparser.ConfigParser()
-        self.config.read('key.ini')
-        self.translation_window = TranslationWindow(self)
+        self.runner = AsyncRunner(self)
+        self.translation_window = None
         self.pdf_viewer = None  # Initialize pdf_viewer as None
+        self.prefetcher = None
+        self.prefetch_focus_id = None
+        self.hovered_paper = None
+        self.hover_timer = QTimer(self)
+        self.hover_timer.setSingleShot(True)
+        self.hover_timer.timeout.connect(lambda: self.prefetch_focus(self.hovered_paper))
+        # Saved watch queries are checked a little after startup and then every INTERVAL_MINUTES
+        self.watch_timer = QTimer(self)
+        self.watch_timer.timeout.connect(self.poll_watches)
+        # Checks every minute and leaves it to due_watches which watches are due, so a poll that finishes
+        # late doesn't push the next one back a whole INTERVAL_MINUTES
+        self.watch_timer.start(WATCH_CHECK_MS)
+        QTimer.singleShot(10000, self.poll_watches)
         self.initUI()
 
     def initUI(self):
@@ -183,6 +348,12 @@ class ArxivApp(QWidget):
         self.query_input.setPlaceholderText("Enter arXiv search query")
         search_layout.addWidget(self.query_input)
 
+        self.sort_combo = QComboBox(self)
+        self.sort_combo.addItem("Relevance", {})
+        self.sort_combo.addItem("Newest", {"sort_by": "submittedDate", "sort_order": "descending"})
+        self.sort_combo.addItem("Recently updated", {"sort_by": "lastUpdatedDate", "sort_order": "descending"})
+        search_layout.addWidget(self.sort_combo)
+
         # Search Button with icon
         self.search_btn = QPushButton("Search", self)
         self.search_btn.setCursor(Qt.PointingHandCursor)
@@ -190,6 +361,23 @@ class ArxivApp(QWidget):
         self.search_btn.clicked.connect(self.search_papers)
         search_layout.addWidget(self.search_btn)
 
+        # Offline search over the local library; with an empty query shows reading history
+        self.library_btn = QPushButton("Library", self)
+        self.library_btn.setCursor(Qt.PointingHandCursor)
+        self.library_btn.clicked.connect(self.search_library)
+        search_layout.addWidget(self.library_btn)
+
+        # Saves the query as a watch; "Watched" lists the new papers its polls find
+        self.watch_btn = QPushButton("Watch", self)
+        self.watch_btn.setCursor(Qt.PointingHandCursor)
+        self.watch_btn.clicked.connect(self.toggle_watch)
+        search_layout.addWidget(self.watch_btn)
+
+        self.watched_btn = QPushButton("Watched", self)
+        self.watched_btn.setCursor(Qt.PointingHandCursor)
+        self.watched_btn.clicked.connect(self.show_watched_papers)
+        search_layout.addWidget(self.watched_btn)
+
         # Translate Button
         self.translate_btn = QPushButton("Translate", self)
         self.translate_btn.setCursor(Qt.PointingHandCursor)
@@ -203,9 +391,20 @@ class ArxivApp(QWidget):
         main_layout = QHBoxLayout()
 
         # Search Results Column
-        self.papers_list = QListWidget(self)
+        self.papers_model = PaperListModel(self.runner, self)
+        self.papers_model.page_loaded.connect(self.on_page_loaded)
+        self.papers_model.page_cancelled.connect(lambda: self.search_btn.setText("Search"))
+        self.papers_list = QListView(self)
+        self.papers_list.setModel(self.papers_model)
         self.papers_list.setCursor(Qt.PointingHandCursor)
         self.papers_list.setSpacing(5)
+        self.papers_list.setWordWrap(True)
+        self.papers_list.selectionModel().currentChanged.connect(self.show_batch_summary)
+        self.papers_list.selectionModel().currentChanged.connect(lambda index, previous: self.prefetch_focus(index.data(Qt.UserRole)))
+        # Hovering a result for a moment prefetches it too
+        self.papers_list.setMouseTracking(True)
+        self.papers_list.entered.connect(self.on_paper_hovered)
+        self.papers_list.verticalScrollBar().valueChanged.connect(self.prefetch_next_page)
         main_layout.addWidget(self.papers_list)
 
         # Summary Column
@@ -221,6 +420,19 @@ class ArxivApp(QWidget):
         self.summarize_btn.setEnabled(False)
         summary_layout.addWidget(self.summarize_btn)
 
+        # Summarizes the whole PDF instead of the abstract, in parallel chunks for long papers
+        self.full_summary_btn = QPushButton("Summarize Full Paper", self)
+        self.full_summary_btn.setCursor(Qt.PointingHandCursor)
+        self.full_summary_btn.clicked.connect(self.summarize_full_paper)
+        self.full_summary_btn.setEnabled(False)
+        summary_layout.addWidget(self.full_summary_btn)
+
+        self.summarize_all_btn = QPushButton("Summarize All", self)
+        self.summarize_all_btn.setCursor(Qt.PointingHandCursor)
+        self.summarize_all_btn.clicked.connect(self.summarize_all_papers)
+        self.summarize_all_btn.setEnabled(False)
+        summary_layout.addWidget(self.summarize_all_btn)
+
         # Add Download and Preview buttons
         button_layout = QHBoxLayout()
         self.download_btn = QPushButton("Download", self)
@@ -235,6 +447,12 @@ class ArxivApp(QWidget):
         self.preview_btn.setEnabled(False)
         button_layout.addWidget(self.preview_btn)
 
+        self.download_all_btn = QPushButton("Download All", self)
+        self.download_all_btn.setCursor(Qt.PointingHandCursor)
+        self.download_all_btn.clicked.connect(self.download_all_papers)
+        self.download_all_btn.setEnabled(False)
+        button_layout.addWidget(self.download_all_btn)
+
         summary_layout.addLayout(button_layout)
 
         main_layout.addLayout(summary_layout)
@@ -244,12 +462,8 @@ class ArxivApp(QWidget):
         chat_label = QLabel("Chat with the Paper")
         chat_layout.addWidget(chat_label)
 
-        self.chat_area = QScrollArea()
-        self.chat_widget = QWidget()
-        self.chat_layout = QVBoxLayout(self.chat_widget)
-        self.chat_area.setWidget(self.chat_widget)
-        self.chat_area.setWidgetResizable(True)
-        chat_layout.addWidget(self.chat_area)
+        self.chat_view = ChatView(self)
+        chat_layout.addWidget(self.chat_view)
 
         input_layout = QHBoxLayout()
         self.question_input = QLineEdit(self)
@@ -274,70 +488,309 @@ class ArxivApp(QWidget):
             QMessageBox.warning(self, "Error", "Please enter a search query.")
             return
 
-        max_results = int(self.config["arXiv"]["MAX_RESULTS"])
-        papers = fetch_arxiv_papers(query, max_results=max_results)
+        page_size = get_setting('arXiv', 'MAX_RESULTS', 5, int)
+        self.search_btn.setText("Searching...")
+        self.reset_prefetch()
+        self.papers_model.search(query, page_size, **self.sort_combo.currentData())
+
+    def search_library(self):
+        query = self.query_input.text().strip()
+        library = get_library()
+        papers = library.search(query) if query else library.history()
+        self.reset_prefetch()
+        self.papers_model.show_papers(papers)
         if papers:
-            self.papers_list.clear()
-            for paper in papers:
-                item = QListWidgetItem(f"{paper['title']}\nID: {paper['id']} | Date: {paper['published_date']} | Authors: {', '.join(paper['authors'])}")
-                item.setData(Qt.UserRole, paper)
-                self.papers_list.addItem(item)
-            self.papers = papers
-            self.summarize_btn.setEnabled(True)
-            self.download_btn.setEnabled(True)
-            self.preview_btn.setEnabled(True)
+            self.enable_paper_actions()
+        else:
+            QMessageBox.information(self, "Library", "No matching papers in the library." if query else "No papers opened yet.")
+
+    def toggle_watch(self):
+        query = self.query_input.text().strip()
+        if not query:
+            QMessageBox.warning(self, "Error", "Please enter a search query to watch.")
+            return
+        from watch import add_watch, find_watch
+        watch = find_watch(query)
+        if watch is not None:
+            if QMessageBox.question(self, "Watch", f"Stop watching \"{watch['query']}\"?") == QMessageBox.Yes:
+                get_library().remove_watch(watch['id'])
+                self.update_watched_count()
+            return
+        watch = add_watch(query)
+        # The first poll only records what exists now; later polls pick up what is new
+        from async_client import poll_watches_async
+        self.runner.submit(poll_watches_async([watch], summarize=False))
+        minutes = get_setting('Watch', 'INTERVAL_MINUTES', 60, float)
+        QMessageBox.information(self, "Watch", f"Watching \"{watch['query']}\". New papers are checked every {minutes:g} minutes.")
+
+    def poll_watches(self):
+        # A poll still summarizing what it found is left to finish rather than superseded
+        if self.runner.running('watch') or not get_library().watches():
+            return
+        task = self.runner.task('watch')
+        from async_client import poll_watches_async
+        task.run(poll_watches_async(on_new=task.post(lambda watch, papers: self.update_watched_count())),
+                 lambda found: self.update_watched_count())
+
+    def update_watched_count(self):
+        unseen = sum(watch['unseen'] for watch in get_library().watches())
+        self.watched_btn.setText(f"Watched ({unseen})" if unseen else "Watched")
+
+    def show_watched_papers(self):
+        # New papers first; once everything has been seen, the latest finds are shown again
+        library = get_library()
+        papers = library.watch_papers(unseen_only=True) or library.watch_papers(limit=50)
+        if not papers:
+            QMessageBox.information(self, "Watched", "No papers from your watches yet.")
+            return
+        self.reset_prefetch()
+        self.papers_model.show_papers(papers)
+        self.enable_paper_actions()
+        library.mark_watch_papers_seen([paper['id'] for paper in papers])
+        self.update_watched_count()
+
+    def on_page_loaded(self, start, count):
+        if start > 0:
+            if self.papers_model.failed and QMessageBox.question(
+                    self, "Error", "Failed to fetch more papers. Try again?") == QMessageBox.Yes:
+                self.papers_model.fetch_next_page(retry=True)
+            return
+        self.search_btn.setText("Search")
+        logging.info(f"Search cache stats: {cache_stats().get('search')}")
+        if count:
+            self.enable_paper_actions()
+            self.prefetch_top_results()
         else:
             QMessageBox.warning(self, "Error", "Failed to fetch papers. Try again.")
 
+    def enable_paper_actions(self):
+        self.summarize_btn.setEnabled(True)
+        self.full_summary_btn.setEnabled(True)
+        self.summarize_all_btn.setEnabled(True)
+        self.download_btn.setEnabled(True)
+        self.preview_btn.setEnabled(True)
+        self.download_all_btn.setEnabled(True)
+
+    def prefetch_next_page(self, value):
+        # Start loading the next page while the user is still a screen away from the end
+        scroll_bar = self.papers_list.verticalScrollBar()
+        if value >= scroll_bar.maximum() - scroll_bar.pageStep():
+            self.papers_model.fetch_next_page()
+
+    def reset_prefetch(self):
+        # New results: speculative work for the old list is dropped and the token budget starts over
+        self.runner.cancel('prefetch')
+        self.runner.cancel('prefetch_focus')
+        self.hover_timer.stop()
+        self.prefetch_focus_id = None
+        self.prefetcher = None
+        if get_setting('Prefetch', 'TOP_N', 0, int) > 0:
+            from prefetch import load_prefetcher
+            self.prefetcher = load_prefetcher()
+
+    def prefetch_top_results(self):
+        if self.prefetcher is None:
+            return
+        task = self.runner.task('prefetch')
+        papers = self.papers_model.papers[:self.prefetcher.top_n]
+        task.run(self.prefetcher.prefetch_papers(papers, on_summary=task.post(self.on_prefetched_summary)))
+
+    def on_paper_hovered(self, index):
+        self.hovered_paper = index.data(Qt.UserRole)
+        self.hover_timer.start(get_setting('Prefetch', 'HOVER_DELAY_MS', 400, int))
+
+    def prefetch_focus(self, paper):
+        # Only the paper last hovered or selected is prefetched; moving on cancels the previous one
+        if self.prefetcher is None or paper is None or paper['id'] == self.prefetch_focus_id:
+            return
+        self.prefetch_focus_id = paper['id']
+        task = self.runner.task('prefetch_focus')
+        task.run(self.prefetcher.prefetch_paper(paper, on_summary=task.post(self.on_prefetched_summary)))
+
+    def on_prefetched_summary(self, paper_id, summary):
+        self.papers_model.set_summary(paper_id, summary)
+        paper = self.selected_paper()
+        if paper and paper['id'] == paper_id:
+            self.show_batch_summary(self.papers_list.currentIndex())
+
+    def selected_paper(self):
+        index = self.papers_list.currentIndex()
+        return index.data(Qt.UserRole) if index.isValid() else None
+
     def process_paper(self):
-        selected_item = self.papers_list.currentItem()
-        if selected_item:
-            selected_paper = selected_item.data(Qt.UserRole)
+        selected_paper = self.selected_paper()
+        if selected_paper:
+            # Work for the previously processed paper is no longer needed
+            self.runner.cancel('index')
+            self.runner.cancel('summary')
+            self.cancel_chat()
+            self.cancel_paper_requests(selected_paper)
+
+            library = get_library()
+            library.mark_opened(selected_paper['id'])
+            summary = library.latest_summary(selected_paper['id'])
+            if summary:
+                # Known paper: reopen it from the library without a Groq round trip
+                self.open_paper(selected_paper, summary)
+                return
+
             self.output_area.setText("Processing... Please wait.")
+            self.summary_streaming = False
+            # A prefetch of this summary still queued is answered ahead of everything else and shared
+            promote_requests(selected_paper['id'])
+            task = self.runner.task('summary')
+            from async_client import summarize_paper_async
+            task.run(summarize_paper_async(selected_paper["summary"], on_token=task.post(self.on_summary_token)),
+                     lambda summary: self.on_processing_finished(summary, selected_paper))
+        else:
+            QMessageBox.warning(self, "Error", "Please select a paper from the list.")
 
-            self.thread = ProcessingThread(selected_paper)
-            self.thread.finished.connect(self.on_processing_finished)
-            self.thread.start()
+    def summarize_full_paper(self):
+        selected_paper = self.selected_paper()
+        if selected_paper:
+            self.runner.cancel('index')
+            self.cancel_chat()
+            self.cancel_paper_requests(selected_paper)
+            get_library().mark_opened(selected_paper['id'])
+
+            self.output_area.setText("Reading the full paper... Please wait.")
+            self.summary_streaming = False
+            task = self.runner.task('summary')
+            from async_client import summarize_full_paper_async
+            task.run(summarize_full_paper_async(selected_paper, on_token=task.post(self.on_summary_token)),
+                     lambda summary: self.on_processing_finished(summary, selected_paper))
         else:
             QMessageBox.warning(self, "Error", "Please select a paper from the list.")
 
+    def cancel_paper_requests(self, paper):
+        # LLM calls still queued for the paper being left are dropped; batch summaries keep their place
+        current = getattr(self, 'current_paper', None)
+        if current is not None and current['id'] != paper['id']:
+            cancel_requests(current['id'])
+
+    def summarize_all_papers(self):
+        self.summarize_all_btn.setEnabled(False)
+        self.batch_completed = 0
+        self.batch_total = len(self.papers_model.papers)
+        self.summarize_all_btn.setText(f"Summarizing 0/{self.batch_total}")
+        task = self.runner.task('batch')
+        on_summary = task.post(self.on_batch_summary)
+        from async_client import summarize_papers_async
+        task.run(summarize_papers_async(list(self.papers_model.papers), on_result=lambda paper, summary: on_summary(paper['id'], summary)),
+                 self.on_batch_finished, self.on_batch_finished)
+
+    def on_batch_summary(self, paper_id, summary):
+        # Results land in the list as they complete, in whatever order Groq answers
+        self.batch_completed += 1
+        self.summarize_all_btn.setText(f"Summarizing {self.batch_completed}/{self.batch_total}")
+        self.papers_model.set_summary(paper_id, summary)
+        paper = self.selected_paper()
+        if paper and paper['id'] == paper_id:
+            self.show_batch_summary(self.papers_list.currentIndex())
+
+    def on_batch_finished(self, result=None):
+        logging.info(f"Scheduler stats: {scheduler_stats()}")
+        self.summarize_all_btn.setText("Summarize All")
+        self.summarize_all_btn.setEnabled(True)
+
+    def show_batch_summary(self, index, previous=None):
+        if not index.isValid():
+            return
+        summary = self.papers_model.summaries.get(index.data(Qt.UserRole)['id'])
+        if summary:
+            self.output_area.setText(f"Summary:\n{summary}")
+
     def download_selected_paper(self):
-        selected_item = self.papers_list.currentItem()
-        if selected_item:
-            paper = selected_item.data(Qt.UserRole)
-            filename = download_paper(paper['pdf_url'], paper['id'])
-            if filename:
-                QMessageBox.information(self, "Success", f"Paper downloaded as {filename}")
-            else:
-                QMessageBox.warning(self, "Error", "Failed to download the paper.")
+        paper = self.selected_paper()
+        if paper:
+            from async_client import download_paper_async
+            self.runner.submit(download_paper_async(paper['pdf_url'], paper['id']), self.on_download_finished)
         else:
             QMessageBox.warning(self, "Error", "Please select a paper from the list.")
 
+    def on_download_finished(self, filename):
+        if filename:
+            QMessageBox.information(self, "Success", f"Paper downloaded as {filename}")
+        else:
+            QMessageBox.warning(self, "Error", "Failed to download the paper.")
+
+    def download_all_papers(self):
+        self.download_all_btn.setEnabled(False)
+        self.download_all_btn.setText("Downloading...")
+        self.download_completed = 0
+        papers = list(self.papers_model.papers)
+        total = len(papers)
+        task = self.runner.task('download_all')
+        on_progress = task.post(self.on_download_progress)
+        from async_client import download_papers_async
+        task.run(download_papers_async(papers, on_result=lambda paper, path: on_progress(total)),
+                 lambda results: self.on_download_all_finished(sum(1 for path in results.values() if path), total))
+
+    def on_download_progress(self, total):
+        self.download_completed += 1
+        self.download_all_btn.setText(f"Downloading {self.download_completed}/{total}")
+
+    def on_download_all_finished(self, downloaded, total):
+        self.download_all_btn.setText("Download All")
+        self.download_all_btn.setEnabled(True)
+        if downloaded == total:
+            from paper_store import paper_dir
+            QMessageBox.information(self, "Success", f"Downloaded {downloaded} papers to {os.path.abspath(paper_dir())}")
+        else:
+            QMessageBox.warning(self, "Error", f"Downloaded {downloaded} of {total} papers.")
+
     def preview_selected_paper(self):
-        selected_item = self.papers_list.currentItem()
-        if selected_item:
-            paper = selected_item.data(Qt.UserRole)
-            filename = f"{paper['id']}.pdf"
-            if not os.path.exists(filename):
-                filename = download_paper(paper['pdf_url'], paper['id'])
-            if filename:
-                if self.pdf_viewer is None:
-                    self.pdf_viewer = PDFViewer(os.path.abspath(filename))
-                else:
-                    self.pdf_viewer.web_view.setUrl(QUrl.fromLocalFile(os.path.abspath(filename)))
-                self.pdf_viewer.show()
-            else:
-                QMessageBox.warning(self, "Error", "Failed to open the paper.")
+        paper = self.selected_paper()
+        if paper:
+            from async_client import download_paper_async
+            self.runner.submit(download_paper_async(paper['pdf_url'], paper['id']), self.show_pdf, key='preview')
         else:
             QMessageBox.warning(self, "Error", "Please select a paper from the list.")
 
-    def on_processing_finished(self, summary, full_text):
+    def show_pdf(self, filename):
+        if filename:
+            if self.pdf_viewer is None:
+                self.pdf_viewer = PDFViewer(os.path.abspath(filename))
+            else:
+                self.pdf_viewer.web_view.setUrl(QUrl.fromLocalFile(os.path.abspath(filename)))
+            self.pdf_viewer.show()
+        else:
+            QMessageBox.warning(self, "Error", "Failed to open the paper.")
+
+    def on_summary_token(self, token):
+        if not self.summary_streaming:
+            self.output_area.setText("Summary:\n")
+            self.summary_streaming = True
+        append_text(self.output_area, token)
+
+    def on_processing_finished(self, summary, paper):
+        from arxiv_utils import record_summary
+        record_summary(paper['id'], summary)
+        self.open_paper(paper, summary)
+
+    def open_paper(self, paper, summary):
         self.output_area.setText(f"Summary:\n{summary}")
-        self.current_paper_text = full_text
+        self.current_paper = paper
+        self.current_paper_text = paper["summary"]
         self.translate_btn.setEnabled(True)  # Enable the translate button
+        # Follow-up questions keep their context; earlier chats about this paper are picked up again
+        from arxiv_utils import load_chat_session
+        self.chat_session, transcript = load_chat_session(paper)
+        self.show_chat_transcript(transcript)
+        # Index the full text afterwards so chat can cover the whole paper
+        from async_client import index_paper_async
+        self.runner.submit(index_paper_async(paper), self.on_paper_indexed, key='index')
+
+    def on_paper_indexed(self, paper_index):
+        # Chat switches from the abstract to retrieval over the full text
+        if paper_index is not None:
+            self.current_paper_text = paper_index
+            self.chat_session.paper_index = paper_index
 
     def open_translation_window(self):
         if hasattr(self, 'current_paper_text'):
+            if self.translation_window is None:
+                self.translation_window = TranslationWindow(self.runner, self)
             self.translation_window.set_text(self.output_area.toPlainText())  # Set the text to be translated
             self.translation_window.show()  # Show the translation window
         else:
@@ -349,36 +802,65 @@ class ArxivApp(QWidget):
             if question:
                 self.add_chat_bubble(question, True)
                 self.question_input.clear()
-                QApplication.processEvents()
-
-                # Start the chat thread with Groq
-                self.chat_thread = ChatThread(self.current_paper_text, question, use_groq=True)
-                self.chat_thread.finished.connect(self.on_chat_finished)
-                self.chat_thread.start()
+                self.chat_question = (self.current_paper['id'], question)
 
                 # Disable the ask button and show a loading message
                 self.ask_btn.setEnabled(False)
                 self.ask_btn.setCursor(Qt.PointingHandCursor)
-                self.add_chat_bubble("Thinking...", False)
+                self.answer_bubble = self.add_chat_bubble("Thinking...", False)
+                self.answer_streaming = False
+
+                # Ask Groq on the shared event loop
+                task = self.runner.task('chat')
+                from async_client import talk_to_paper_with_groq_async
+                task.run(talk_to_paper_with_groq_async(self.current_paper_text, question, on_token=task.post(self.on_chat_token),
+                                                       session=self.chat_session),
+                         self.on_chat_finished)
             else:
                 QMessageBox.warning(self, "Error", "Please enter a question.")
         else:
             QMessageBox.warning(self, "Error", "Please process a paper first.")
 
+    def on_chat_token(self, token):
+        # The placeholder bubble becomes the answer bubble on the first token
+        if not self.answer_streaming:
+            self.answer_bubble.set_text(token)
+            self.answer_streaming = True
+        else:
+            self.answer_bubble.append_text(token)
+
     def on_chat_finished(self, answer):
-        self.chat_layout.itemAt(self.chat_layout.count() - 1).widget().setParent(None)
-        self.add_chat_bubble(answer, False)
+        paper_id, question = self.chat_question
+        from arxiv_utils import record_chat
+        record_chat(paper_id, question, answer)
+        self.answer_bubble.set_text(answer)
         self.ask_btn.setEnabled(True)
         self.ask_btn.setCursor(Qt.PointingHandCursor)
 
+    def cancel_chat(self):
+        if 'chat' in self.runner.tasks and not self.ask_btn.isEnabled():
+            self.runner.cancel('chat')
+            self.answer_bubble.append_text(" [cancelled]")
+            self.ask_btn.setEnabled(True)
+
+    def closeEvent(self, event):
+        self.runner.shutdown()
+        super().closeEvent(event)
+
+    def show_chat_transcript(self, transcript):
+        self.chat_view.set_messages([(message['content'], message['role'] == 'user') for message in transcript])
+
     def add_chat_bubble(self, text, is_user):
-        bubble = ChatBubble(text, is_user)
-        self.chat_layout.addWidget(bubble)
-        self.chat_area.verticalScrollBar().setValue(self.chat_area.verticalScrollBar().maximum())
+        return self.chat_view.add_message(text, is_user)
 
 # Initialize and run the PyQt5 application
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    # Required by QtWebEngine when it is imported after the application is created
+    QApplication.setAttribute(Qt.AA_ShareOpenGLContexts)
     app = QApplication(sys.argv)
     ex = ArxivApp()
     ex.show()
+    ex.runner.start()
+    start_exporters()
     sys.exit(app.exec_())
@@ -0,0 +1,258 @@
+import asyncio
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from settings import get_setting
+
+# Upper bounds in seconds, from a cache hit to a long map-reduce summary
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+HELP = {
+    'garx_operation_seconds': "Duration of searches, feed parsing and downloads",
+    'garx_llm_request_seconds': "Duration of chat completion requests per task and backend",
+    'garx_llm_first_token_seconds': "Time to the first streamed token",
+    'garx_gui_task_seconds': "Duration of background tasks started by the GUI",
+    'garx_llm_requests_total': "Chat completion calls by result (sent, cached, coalesced)",
+    'garx_llm_tokens_total': "Tokens used, as reported by the backend or estimated",
+    'garx_llm_cost_dollars_total': "Spend computed from [Pricing] in key.ini",
+    'garx_http_retries_total': "HTTP retries after 429/5xx responses or connection errors",
+    'garx_timeouts_total': "Operations that ended in a timeout",
+    'garx_prefetch_total': "Speculative summaries and PDF downloads by result",
+    'garx_watch_new_papers_total': "New papers found by saved watch queries",
+}
+
+# requests registers its Timeout here (see http_client) so this module doesn't import it
+TIMEOUT_ERRORS = (TimeoutError, asyncio.TimeoutError)
+
+_lock = threading.Lock()
+_histograms = {}
+_counters = {}
+_json_log = logging.getLogger('garx.metrics')
+_json_log.propagate = False
+_exporters_started = False
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.recent = deque(maxlen=1000)
+
+    def observe(self, value):
+        index = next((i for i, bound in enumerate(BUCKETS) if value <= bound), len(BUCKETS))
+        self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+        self.recent.append(value)
+
+def register_timeout_error(error_type):
+    global TIMEOUT_ERRORS
+    if error_type not in TIMEOUT_ERRORS:
+        TIMEOUT_ERRORS = TIMEOUT_ERRORS + (error_type,)
+
+def label_key(labels):
+    return tuple(sorted((name, str(value)) for name, value in labels.items() if value is not None))
+
+def log_event(event, **fields):
+    # Structured JSON lines, written only when [Metrics] JSON_LOG is set
+    if _json_log.handlers:
+        _json_log.info(json.dumps(dict(fields, event=event, ts=round(time.time(), 3)), ensure_ascii=False, default=str))
+
+def observe(metric, seconds, **labels):
+    key = (metric, label_key(labels))
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = Histogram()
+        histogram.observe(seconds)
+    log_event(metric, seconds=round(seconds, 4), **labels)
+
+def inc(metric, amount=1, **labels):
+    key = (metric, label_key(labels))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+class Timer:
+    # Context manager (sync or async code) recording the block's duration; set .outcome for failures
+    # that don't raise, e.g. a search that returned None
+    def __init__(self, metric, labels):
+        self.metric = metric
+        self.labels = labels
+        self.outcome = 'ok'
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc is not None:
+            if isinstance(exc, TIMEOUT_ERRORS):
+                self.outcome = 'timeout'
+            elif isinstance(exc, asyncio.CancelledError):
+                self.outcome = 'cancelled'
+            else:
+                self.outcome = 'error'
+        if self.outcome == 'timeout':
+            inc('garx_timeouts_total', **self.labels)
+        observe(self.metric, time.perf_counter() - self.start, outcome=self.outcome, **self.labels)
+        return False
+
+def timed(operation):
+    return Timer('garx_operation_seconds', {'operation': operation})
+
+def price(model):
+    # [Pricing] <model> = dollars per million input tokens, per million output tokens
+    value = get_setting('Pricing', model)
+    if not value:
+        return None
+    prompt, completion = (float(part) for part in value.split(','))
+    return prompt, completion
+
+def record_usage(task, backend, model, prompt_tokens, completion_tokens, estimated=False):
+    labels = {'task': task, 'backend': backend, 'model': model}
+    inc('garx_llm_tokens_total', prompt_tokens, kind='prompt', **labels)
+    inc('garx_llm_tokens_total', completion_tokens, kind='completion', **labels)
+    cost = None
+    prices = price(model)
+    if prices is not None:
+        cost = (prompt_tokens * prices[0] + completion_tokens * prices[1]) / 1e6
+        inc('garx_llm_cost_dollars_total', cost, **labels)
+    log_event('llm_usage', prompt_tokens=prompt_tokens, completion_tokens=completion_tokens, estimated=estimated,
+              cost=round(cost, 6) if cost is not None else None, **labels)
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+def snapshot():
+    from cache import cache_stats
+    from scheduler import scheduler_stats
+    with _lock:
+        histograms = {key: (histogram.count, histogram.sum, list(histogram.recent)) for key, histogram in _histograms.items()}
+        counters = dict(_counters)
+    timings = []
+    for (metric, labels), (count, total, recent) in sorted(histograms.items()):
+        timings.append(dict(labels, metric=metric, count=count, mean_ms=round(total / count * 1000, 1),
+                            p50_ms=round(percentile(recent, 0.5) * 1000, 1), p95_ms=round(percentile(recent, 0.95) * 1000, 1),
+                            max_ms=round(max(recent) * 1000, 1)))
+    return {
+        'timings': timings,
+        'counters': [dict(labels, metric=metric, value=round(value, 6)) for (metric, labels), value in sorted(counters.items())],
+        'caches': cache_stats(),
+        'schedulers': scheduler_stats(),
+    }
+
+def escape_label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{escape_label(value)}"' for name, value in labels) + "}"
+
+def prometheus_text():
+    # Prometheus text exposition format
+    from cache import cache_stats
+    from scheduler import scheduler_stats
+    with _lock:
+        histograms = {key: (list(histogram.counts), histogram.sum, histogram.count) for key, histogram in _histograms.items()}
+        counters = dict(_counters)
+    lines = []
+    for metric in sorted({metric for metric, _ in histograms}):
+        lines += [f"# HELP {metric} {HELP.get(metric, metric)}", f"# TYPE {metric} histogram"]
+        for (name, labels), (counts, total, count) in sorted(histograms.items()):
+            if name != metric:
+                continue
+            cumulative = 0
+            for bound, bucket_count in zip(BUCKETS + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f"{metric}_bucket{format_labels(labels + (('le', le),))} {cumulative}")
+            lines.append(f"{metric}_sum{format_labels(labels)} {total}")
+            lines.append(f"{metric}_count{format_labels(labels)} {count}")
+    for metric in sorted({metric for metric, _ in counters}):
+        lines += [f"# HELP {metric} {HELP.get(metric, metric)}", f"# TYPE {metric} counter"]
+        lines += [f"{metric}{format_labels(labels)} {value}" for (name, labels), value in sorted(counters.items()) if name == metric]
+    gauges = {}
+    for name, stats in cache_stats().items():
+        for field in ('hits', 'misses', 'stale', 'revalidated', 'hit_rate', 'entries'):
+            if field in stats:
+                gauges.setdefault(f"garx_cache_{field}", []).append(((('cache', name),), stats[field]))
+    for name, stats in scheduler_stats().items():
+        for field in ('queue_depth', 'max_queue_depth', 'in_flight', 'submitted', 'granted', 'cancelled', 'coalesced'):
+            gauges.setdefault(f"garx_scheduler_{field}", []).append(((('scheduler', name),), stats[field]))
+    for metric, samples in sorted(gauges.items()):
+        lines.append(f"# TYPE {metric} gauge")
+        lines += [f"{metric}{format_labels(labels)} {value}" for labels, value in samples]
+    return "\n".join(lines) + "\n"
+
+def write_exports():
+    path = get_setting('Metrics', 'PROMETHEUS_FILE')
+    if path:
+        # Written then renamed so a node_exporter textfile collector never reads half a file
+        with open(path + '.tmp', 'w') as f:
+            f.write(prometheus_text())
+        os.replace(path + '.tmp', path)
+    if _json_log.handlers:
+        log_event('snapshot', **snapshot())
+
+def _export_loop(interval):
+    while True:
+        time.sleep(interval)
+        try:
+            write_exports()
+        except Exception as e:
+            logging.warning(f"Error exporting metrics: {e}")
+
+def serve_prometheus(port):
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path == '/metrics':
+                body, content_type = prometheus_text().encode(), 'text/plain; version=0.0.4'
+            elif self.path == '/metrics.json':
+                body, content_type = json.dumps(snapshot()).encode(), 'application/json'
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="garx-metrics", daemon=True).start()
+    logging.info(f"Serving metrics on http://127.0.0.1:{server.server_address[1]}/metrics")
+    return server
+
+def start_exporters():
+    # Everything is opt-in through [Metrics] in key.ini
+    global _exporters_started
+    if _exporters_started:
+        return
+    _exporters_started = True
+    json_log = get_setting('Metrics', 'JSON_LOG')
+    if json_log:
+        handler = logging.FileHandler(json_log, encoding='utf-8')
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        _json_log.addHandler(handler)
+        _json_log.setLevel(logging.INFO)
+    port = get_setting('Metrics', 'PROMETHEUS_PORT', None, int)
+    if port is not None:
+        try:
+            serve_prometheus(port)
+        except OSError as e:
+            logging.error(f"Could not serve metrics on port {port}: {e}")
+    if json_log or get_setting('Metrics', 'PROMETHEUS_FILE'):
+        interval = get_setting('Metrics', 'EXPORT_INTERVAL', 15, float)
+        threading.Thread(target=_export_loop, args=(interval,), name="garx-metrics-export", daemon=True).start()
+        atexit.register(write_exports)
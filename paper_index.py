@@ -0,0 +1,97 @@
+import math
+import re
+from collections import Counter
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# Numbered ("3.1 Results") or well-known unnumbered section headings on their own line
+HEADING_RE = re.compile(
+    r"^\s*(?:(?:\d+(?:\.\d+)*\.?|[IVX]+\.)\s+[A-Z][^\n]{0,70}"
+    r"|(?:abstract|introduction|related work|background|conclusions?|discussion|references|acknowledgements?|appendix)\s*)$",
+    re.IGNORECASE | re.MULTILINE,
+)
+
+SKIPPED_SECTIONS = ("references", "bibliography", "acknowledgement", "acknowledgment")
+
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the this to was were what which with "
+    "how why does do can we our paper".split()
+)
+
+def tokenize(text):
+    return [token for token in TOKEN_RE.findall(text.lower()) if token not in STOPWORDS]
+
+def extract_pdf_text(pdf_path):
+    import fitz
+    with fitz.open(pdf_path) as document:
+        return "\n".join(page.get_text() for page in document)
+
+def split_sections(text):
+    sections = []
+    title = "Front matter"
+    position = 0
+    for match in HEADING_RE.finditer(text):
+        sections.append((title, text[position:match.start()]))
+        title = match.group(0).strip()
+        position = match.end()
+    sections.append((title, text[position:]))
+    return [(title, body) for title, body in sections if body.strip()]
+
+def chunk_text(text, chunk_words=200, overlap=40):
+    chunks = []
+    for section, body in split_sections(text):
+        if section.lower().lstrip("0123456789. ").startswith(SKIPPED_SECTIONS):
+            continue
+        words = body.split()
+        step = max(chunk_words - overlap, 1)
+        for start in range(0, len(words), step):
+            chunks.append({"section": section, "text": " ".join(words[start:start + chunk_words])})
+            if start + chunk_words >= len(words):
+                break
+    return chunks
+
+class PaperIndex:
+    # Okapi BM25 over the paper's chunks
+    def __init__(self, chunks, k1=1.5, b=0.75):
+        self.chunks = chunks
+        self.k1 = k1
+        self.b = b
+        self.term_freqs = [Counter(tokenize(chunk["section"] + " " + chunk["text"])) for chunk in chunks]
+        self.lengths = [sum(freqs.values()) for freqs in self.term_freqs]
+        self.avg_length = sum(self.lengths) / len(self.lengths) if self.lengths else 0.0
+        doc_freqs = Counter()
+        for freqs in self.term_freqs:
+            doc_freqs.update(freqs.keys())
+        total = len(chunks)
+        self.idf = {term: math.log(1 + (total - df + 0.5) / (df + 0.5)) for term, df in doc_freqs.items()}
+
+    def score(self, query_terms, i):
+        freqs = self.term_freqs[i]
+        norm = self.k1 * (1 - self.b + self.b * self.lengths[i] / (self.avg_length or 1))
+        score = 0.0
+        for term in query_terms:
+            tf = freqs.get(term)
+            if tf:
+                score += self.idf[term] * tf * (self.k1 + 1) / (tf + norm)
+        return score
+
+    def search(self, query, top_k=4):
+        query_terms = set(tokenize(query))
+        scored = [(self.score(query_terms, i), i) for i in range(len(self.chunks))]
+        best = sorted((item for item in scored if item[0] > 0), reverse=True)[:top_k]
+        if not best:
+            # Nothing matched lexically; fall back to the opening chunks
+            best = [(0.0, i) for i in range(min(top_k, len(self.chunks)))]
+        # Keep the selected chunks in reading order
+        return [self.chunks[i] for _, i in sorted(best, key=lambda item: item[1])]
+
+    def context(self, query, top_k=4):
+        return "\n\n".join(f"[{chunk['section']}]\n{chunk['text']}" for chunk in self.search(query, top_k))
+
+def index_text(text, abstract=None, chunk_words=200, overlap=40):
+    chunks = chunk_text(text, chunk_words, overlap)
+    if abstract:
+        chunks.insert(0, {"section": "Abstract", "text": " ".join(abstract.split())})
+    if not chunks:
+        return None
+    return PaperIndex(chunks)
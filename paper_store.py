@@ -0,0 +1,134 @@
+import logging
+import os
+import re
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import requests
+import http_client
+import metrics
+from library import get_library
+from settings import get_setting
+
+CHUNK_SIZE = 64 * 1024
+MAX_RESUME_ATTEMPTS = 3
+# check_part's answer when the .part file needs another fetch
+RESUME = object()
+
+_path_locks = {}
+_path_locks_lock = threading.Lock()
+
+def paper_dir():
+    return get_setting('Papers', 'PAPER_DIR', 'papers')
+
+def paper_path(paper_id, directory=None):
+    # Papers are stored by arXiv ID including the version, e.g. papers/2101.00001v2.pdf
+    filename = re.sub(r'[^\w.-]', '_', paper_id) + '.pdf'
+    return os.path.join(directory or paper_dir(), filename)
+
+def _lock_for(path):
+    with _path_locks_lock:
+        return _path_locks.setdefault(path, threading.Lock())
+
+def record_pdf_path(paper_id, path):
+    try:
+        get_library().set_pdf_path(paper_id, os.path.abspath(path))
+    except sqlite3.Error as e:
+        logging.error(f"Error recording PDF path in library: {e}")
+
+def expected_size(status_code, headers):
+    if status_code == 206:
+        content_range = headers.get('Content-Range', '')
+        total = content_range.rsplit('/', 1)[-1]
+        return int(total) if total.isdigit() else None
+    length = headers.get('Content-Length')
+    return int(length) if length and length.isdigit() else None
+
+def download_target(pdf_url, paper_id, directory=None):
+    # Returns (path, done): done when the paper is already stored or can't be downloaded (path is then None)
+    path = paper_path(paper_id, directory)
+    if os.path.exists(path):
+        return path, True
+    if not pdf_url:
+        logging.error(f"No PDF link for paper {paper_id}")
+        return None, True
+    return path, False
+
+def check_part(paper_id, path, expected):
+    # After a fetch into path + '.part': moves a complete file into place and returns its path,
+    # returns RESUME when bytes are missing, or None when the file is broken (it is removed)
+    part_path = path + '.part'
+    size = os.path.getsize(part_path)
+    if expected is not None and size < expected:
+        logging.warning(f"Download of {paper_id} incomplete ({size}/{expected} bytes), resuming")
+        return RESUME
+    if expected is not None and size != expected:
+        logging.error(f"Download of {paper_id} has unexpected size ({size}/{expected} bytes)")
+        os.remove(part_path)
+        return None
+    os.replace(part_path, path)
+    record_pdf_path(paper_id, path)
+    return path
+
+def _fetch_to_part(pdf_url, part_path):
+    # Streams into the .part file, resuming from its current size; returns the expected total size
+    offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    headers = {'Range': f'bytes={offset}-'} if offset else {}
+    with http_client.get(pdf_url, headers=headers, stream=True) as response:
+        if response.status_code == 416:
+            # The partial file does not match the remote one; start over
+            os.remove(part_path)
+            return _fetch_to_part(pdf_url, part_path)
+        response.raise_for_status()
+        if offset and response.status_code != 206:
+            offset = 0  # Server ignored the Range header and sent the whole file
+        expected = expected_size(response.status_code, response.headers)
+        with open(part_path, 'ab' if offset else 'wb') as f:
+            for chunk in response.iter_content(CHUNK_SIZE):
+                f.write(chunk)
+    return expected
+
+def download_paper(pdf_url, paper_id, directory=None):
+    path, done = download_target(pdf_url, paper_id, directory)
+    if done:
+        return path
+
+    with metrics.timed('download') as timer:
+        path = _download_paper(pdf_url, paper_id, path)
+        if path is None:
+            timer.outcome = 'error'
+    return path
+
+def _download_paper(pdf_url, paper_id, path):
+    with _lock_for(path):
+        if os.path.exists(path):
+            return path
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        part_path = path + '.part'
+        for attempt in range(MAX_RESUME_ATTEMPTS):
+            try:
+                expected = _fetch_to_part(pdf_url, part_path)
+            except (requests.exceptions.ConnectionError, requests.exceptions.ChunkedEncodingError) as e:
+                logging.warning(f"Download of {paper_id} interrupted, resuming: {e}")
+                continue
+            except requests.exceptions.RequestException as e:
+                logging.error(f"Error downloading paper {paper_id}: {e}")
+                return None
+            result = check_part(paper_id, path, expected)
+            if result is not RESUME:
+                return result
+        logging.error(f"Giving up on downloading paper {paper_id} after {MAX_RESUME_ATTEMPTS} attempts")
+        return None
+
+def download_papers(papers, max_workers=None, directory=None, on_result=None):
+    # Downloads a batch concurrently; on_result(paper, path) is called as each one completes
+    workers = max_workers or get_setting('Papers', 'DOWNLOAD_WORKERS', 4, int)
+    results = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(download_paper, paper['pdf_url'], paper['id'], directory): paper for paper in papers}
+        for future in as_completed(futures):
+            paper = futures[future]
+            results[paper['id']] = future.result()
+            if on_result is not None:
+                on_result(paper, results[paper['id']])
+    return results
@@ -0,0 +1,68 @@
+import asyncio
+import logging
+import os
+import metrics
+from arxiv_utils import SUMMARY_MAX_TOKENS, record_summary, request_budget, summary_messages
+from async_client import download_paper_async, run_blocking, summarize_paper_async
+from library import get_library
+from paper_store import paper_path
+from scheduler import PREFETCH
+from settings import get_setting
+
+class Prefetcher:
+    # Speculative summaries and PDFs for one list of search results, so Summarize and Preview are
+    # usually instant. Requests go out at PREFETCH priority, summaries draw on a token budget for the
+    # whole list and PDFs are downloaded one at a time under a bandwidth limit.
+    def __init__(self, top_n, token_budget, max_rate=None):
+        self.top_n = top_n
+        self.tokens_left = token_budget
+        self.max_rate = max_rate
+
+    def spend(self, tokens):
+        if tokens > self.tokens_left:
+            return False
+        self.tokens_left -= tokens
+        return True
+
+    async def prefetch_summary(self, paper, on_summary=None):
+        if await run_blocking(lambda: get_library().latest_summary(paper['id'])):
+            return
+        # Charged up front with the same estimate the rate limiter uses
+        if not self.spend(await run_blocking(request_budget, summary_messages(paper['summary']), SUMMARY_MAX_TOKENS)):
+            metrics.inc('garx_prefetch_total', kind='summary', result='over_budget')
+            logging.info(f"Prefetch token budget used up, not summarizing {paper['id']}")
+            return
+        # Grouped by paper ID, so opening the paper promotes the request and leaving it cancels it
+        summary = await summarize_paper_async(paper['summary'], priority=PREFETCH, group=paper['id'])
+        if summary.startswith("Error"):
+            metrics.inc('garx_prefetch_total', kind='summary', result='error')
+            return
+        await run_blocking(record_summary, paper['id'], summary)
+        metrics.inc('garx_prefetch_total', kind='summary', result='done')
+        if on_summary is not None:
+            on_summary(paper['id'], summary)
+
+    async def prefetch_pdf(self, paper):
+        if os.path.exists(paper_path(paper['id'])):
+            return
+        path = await download_paper_async(paper['pdf_url'], paper['id'], max_rate=self.max_rate)
+        metrics.inc('garx_prefetch_total', kind='pdf', result='done' if path else 'error')
+
+    async def prefetch_paper(self, paper, on_summary=None):
+        await asyncio.gather(self.prefetch_summary(paper, on_summary), self.prefetch_pdf(paper))
+
+    async def prefetch_papers(self, papers, on_summary=None):
+        # Summaries are all queued at once and paced by the scheduler; PDFs go one after another
+        async def download_all():
+            for paper in papers:
+                await self.prefetch_pdf(paper)
+
+        await asyncio.gather(*(self.prefetch_summary(paper, on_summary) for paper in papers), download_all())
+
+def load_prefetcher():
+    # Prefetching is off unless [Prefetch] TOP_N is set
+    top_n = get_setting('Prefetch', 'TOP_N', 0, int)
+    if top_n <= 0:
+        return None
+    kbps = get_setting('Prefetch', 'BANDWIDTH_KBPS', 512, int)
+    return Prefetcher(top_n, get_setting('Prefetch', 'TOKEN_BUDGET', 20000, int), kbps * 1024 if kbps > 0 else None)
@@ -0,0 +1,103 @@
+import asyncio
+import importlib
+import logging
+import threading
+import time
+from PyQt5.QtCore import QObject, pyqtSignal
+import metrics
+
+class AsyncTask:
+    def __init__(self, runner, key=None):
+        self.runner = runner
+        self.key = key
+        self.future = None
+        self.cancelled = False
+
+    def post(self, callback):
+        # Thread-safe wrapper that runs callback on the Qt thread unless the task was cancelled
+        return lambda *args: self.runner.deliver.emit(self, callback, args)
+
+    def run(self, coro, on_done=None, on_error=None):
+        self.runner.start()
+        self.started = time.perf_counter()
+        self.future = asyncio.run_coroutine_threadsafe(coro, self.runner.loop)
+        self.future.add_done_callback(lambda future: self._finished(future, on_done, on_error))
+        return self
+
+    def _finished(self, future, on_done, on_error):
+        outcome = 'cancelled' if future.cancelled() else 'error' if future.exception() is not None else 'ok'
+        metrics.observe('garx_gui_task_seconds', time.perf_counter() - self.started, task=self.key or 'other', outcome=outcome)
+        if future.cancelled():
+            return
+        error = future.exception()
+        if error is not None:
+            logging.error(f"Background task failed: {error!r}")
+            if on_error is not None:
+                self.post(on_error)(error)
+        elif on_done is not None:
+            self.post(on_done)(future.result())
+
+    def cancel(self):
+        self.cancelled = True
+        if self.future is not None:
+            self.future.cancel()
+
+class AsyncRunner(QObject):
+    # One asyncio loop in a background thread for all network work; results are delivered as Qt signals
+    deliver = pyqtSignal(object, object, object)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.deliver.connect(self._deliver)
+        self.tasks = {}
+        self.loop = asyncio.new_event_loop()
+        self.thread = None
+
+    def start(self):
+        # Deferred until the window is up: the loop thread then imports the network stack in the background
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run_loop, name="garx-asyncio", daemon=True)
+            self.thread.start()
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.call_soon(importlib.import_module, 'async_client')
+        self.loop.run_forever()
+
+    def _deliver(self, task, callback, args):
+        if not task.cancelled:
+            callback(*args)
+
+    def task(self, key=None):
+        # A new task with the same key supersedes (and cancels) the previous one
+        if key is not None:
+            self.cancel(key)
+        task = AsyncTask(self, key)
+        if key is not None:
+            self.tasks[key] = task
+        return task
+
+    def running(self, key):
+        task = self.tasks.get(key)
+        return task is not None and task.future is not None and not task.future.done()
+
+    def submit(self, coro, on_done=None, on_error=None, key=None):
+        return self.task(key).run(coro, on_done, on_error)
+
+    def cancel(self, key):
+        task = self.tasks.pop(key, None)
+        if task is not None:
+            task.cancel()
+
+    def shutdown(self):
+        for key in list(self.tasks):
+            self.cancel(key)
+        if self.thread is None:
+            return
+        from async_client import close_async_session
+        try:
+            asyncio.run_coroutine_threadsafe(close_async_session(), self.loop).result(timeout=5)
+        except Exception as e:
+            logging.warning(f"Error closing HTTP session: {e}")
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(timeout=5)
@@ -0,0 +1,71 @@
+import threading
+import time
+from settings import get_setting
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+class TokenBucket:
+    def __init__(self, per_minute):
+        self.rate = per_minute / 60.0
+        self.capacity = float(per_minute)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def _take(self, amount):
+        # Takes the tokens and returns 0, or returns how long to wait before retrying
+        amount = min(amount, self.capacity)  # Requests larger than the bucket pass once it is full
+        with self.lock:
+            self._refill()
+            if self.tokens >= amount:
+                self.tokens -= amount
+                return 0.0
+            return (amount - self.tokens) / self.rate
+
+    def delay(self, amount=1, keep=0.0):
+        # How long until amount tokens are available, without taking them; keep is the share of the
+        # bucket that must still be left afterwards
+        needed = min(amount + keep * self.capacity, self.capacity)
+        with self.lock:
+            self._refill()
+            return 0.0 if self.tokens >= needed else (needed - self.tokens) / self.rate
+
+class RateLimiter:
+    def __init__(self, requests_per_minute=None, tokens_per_minute=None):
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+
+    def reserve(self, tokens=0, headroom=0.0):
+        # Non-blocking: takes from both buckets only when both have room (plus headroom, a share of each
+        # bucket left untouched), otherwise returns the wait.
+        # Only safe with a single consumer, which is how the scheduler uses it.
+        delays = []
+        if self.requests is not None:
+            delays.append(self.requests.delay(1, headroom))
+        if self.tokens is not None and tokens:
+            delays.append(self.tokens.delay(tokens, headroom))
+        delay = max(delays, default=0.0)
+        if delay:
+            return delay
+        if self.requests is not None:
+            self.requests._take(1)
+        if self.tokens is not None and tokens:
+            self.tokens._take(tokens)
+        return 0.0
+
+def get_limiter(section):
+    # Shared limiter per provider section of key.ini, e.g. [Groq]
+    if section not in _limiters:
+        with _limiters_lock:
+            if section not in _limiters:
+                _limiters[section] = RateLimiter(
+                    get_setting(section, 'REQUESTS_PER_MINUTE', None, int),
+                    get_setting(section, 'TOKENS_PER_MINUTE', None, int),
+                )
+    return _limiters[section]
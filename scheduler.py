@@ -0,0 +1,252 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from metrics import percentile
+from rate_limit import get_limiter
+from settings import get_setting
+
+# Lower runs first: a question typed by the user goes ahead of queued batch summaries,
+# and speculative prefetches only run when nothing else is waiting
+INTERACTIVE = 0
+BATCH = 1
+PREFETCH = 2
+PRIORITY_NAMES = {INTERACTIVE: 'interactive', BATCH: 'batch', PREFETCH: 'prefetch'}
+
+_schedulers = {}
+_schedulers_lock = threading.Lock()
+
+class RequestCancelled(Exception):
+    pass
+
+class Ticket:
+    def __init__(self, priority, tokens, group, notify):
+        self.priority = priority
+        self.tokens = tokens
+        self.group = group
+        self.notify = notify
+        self.enqueued = time.monotonic()
+        self.waited = 0.0
+        self.done = False
+
+class Scheduler:
+    # Single gate in front of a provider's rate limiter. Waiting requests are granted in priority order
+    # (FIFO within a priority) by one dispatcher thread, so sync callers and asyncio tasks share one queue.
+    def __init__(self, limiter, name):
+        self.limiter = limiter
+        self.name = name
+        self.queue = []
+        self.inflight = {}
+        self.counter = itertools.count()
+        self.cond = threading.Condition()
+        self.thread = None
+        self.waits = {priority: deque(maxlen=1000) for priority in PRIORITY_NAMES}
+        self.submitted = 0
+        self.granted = 0
+        self.cancelled = 0
+        self.coalesced = 0
+        self.max_depth = 0
+        # Share of the rate limit a prefetch must leave unused, so a click right after it isn't kept waiting
+        self.prefetch_headroom = get_setting('Prefetch', 'HEADROOM', 0.5, float)
+
+    def _waiting(self):
+        # A promoted ticket leaves a stale entry behind at its old priority
+        return [entry[2] for entry in self.queue if not entry[2].done and entry[0] == entry[2].priority]
+
+    def _depth(self):
+        return len(self._waiting())
+
+    def _enqueue(self, tokens, priority, group, notify):
+        ticket = Ticket(priority, tokens, group, notify)
+        with self.cond:
+            heapq.heappush(self.queue, (priority, next(self.counter), ticket))
+            self.submitted += 1
+            self.max_depth = max(self.max_depth, self._depth())
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._dispatch, name=f"garx-{self.name}-scheduler", daemon=True)
+                self.thread.start()
+            self.cond.notify()
+        return ticket
+
+    def _dispatch(self):
+        with self.cond:
+            while True:
+                while self.queue and (self.queue[0][2].done or self.queue[0][0] != self.queue[0][2].priority):
+                    heapq.heappop(self.queue)
+                if not self.queue:
+                    self.cond.wait()
+                    continue
+                ticket = self.queue[0][2]
+                delay = self.limiter.reserve(ticket.tokens, self.prefetch_headroom if ticket.priority == PREFETCH else 0.0)
+                if delay:
+                    # Woken early when a higher priority request arrives or the head is cancelled
+                    self.cond.wait(delay)
+                    continue
+                heapq.heappop(self.queue)
+                ticket.done = True
+                ticket.waited = time.monotonic() - ticket.enqueued
+                self.waits[ticket.priority].append(ticket.waited)
+                self.granted += 1
+                ticket.notify(None)
+
+    def _cancel_ticket(self, ticket):
+        with self.cond:
+            if not ticket.done:
+                ticket.done = True
+                self.cancelled += 1
+                self.cond.notify()
+
+    def acquire(self, tokens=0, priority=INTERACTIVE, group=None):
+        # Blocks until the request may be sent; returns the seconds spent queued
+        granted = threading.Event()
+        outcome = []
+        ticket = self._enqueue(tokens, priority, group, lambda error: (outcome.append(error), granted.set()))
+        granted.wait()
+        if outcome[0] is not None:
+            raise outcome[0]
+        return ticket.waited
+
+    async def acquire_async(self, tokens=0, priority=INTERACTIVE, group=None):
+        loop = asyncio.get_running_loop()
+        granted = loop.create_future()
+
+        def resolve(error):
+            if not granted.done():
+                if error is None:
+                    granted.set_result(None)
+                else:
+                    granted.set_exception(error)
+
+        ticket = self._enqueue(tokens, priority, group, lambda error: loop.call_soon_threadsafe(resolve, error))
+        try:
+            await granted
+        except asyncio.CancelledError:
+            self._cancel_ticket(ticket)
+            raise
+        return ticket.waited
+
+    def cancel(self, group):
+        # Drops queued requests of a group, e.g. everything still waiting for a paper the user left
+        with self.cond:
+            tickets = [ticket for ticket in self._waiting() if ticket.group == group]
+            for ticket in tickets:
+                ticket.done = True
+                ticket.notify(RequestCancelled(f"Request for {group} cancelled"))
+            self.cancelled += len(tickets)
+            self.cond.notify()
+        if tickets:
+            logging.info(f"Cancelled {len(tickets)} queued {self.name} requests for {group}")
+        return len(tickets)
+
+    def promote(self, group, priority=INTERACTIVE):
+        # Moves a group's queued requests up, e.g. a prefetched summary the user has now asked for
+        with self.cond:
+            tickets = [ticket for ticket in self._waiting() if ticket.group == group and ticket.priority > priority]
+            for ticket in tickets:
+                ticket.priority = priority
+                heapq.heappush(self.queue, (priority, next(self.counter), ticket))
+            if tickets:
+                self.cond.notify()
+        return len(tickets)
+
+    def _join(self, key):
+        with self.cond:
+            future = self.inflight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return future, False
+            future = Future()
+            self.inflight[key] = future
+            return future, True
+
+    def _finish(self, key, future, result=None, error=None):
+        with self.cond:
+            if self.inflight.get(key) is future:
+                del self.inflight[key]
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def run(self, key, call):
+        # Identical requests already in flight share one call. Returns (result, coalesced).
+        while True:
+            future, owner = self._join(key)
+            if owner:
+                try:
+                    result = call()
+                except BaseException as e:
+                    self._finish(key, future, error=e)
+                    raise
+                self._finish(key, future, result)
+                return result, False
+            try:
+                return future.result(), True
+            except RequestCancelled:
+                continue  # The request we joined was cancelled, make our own
+
+    async def run_async(self, key, call):
+        while True:
+            future, owner = self._join(key)
+            if owner:
+                try:
+                    result = await call()
+                except asyncio.CancelledError:
+                    self._finish(key, future, error=RequestCancelled("Coalesced request cancelled"))
+                    raise
+                except BaseException as e:
+                    self._finish(key, future, error=e)
+                    raise
+                self._finish(key, future, result)
+                return result, False
+            try:
+                # Shielded so that cancelling this caller doesn't cancel the shared call
+                return await asyncio.shield(asyncio.wrap_future(future)), True
+            except RequestCancelled:
+                continue
+
+    def stats(self):
+        with self.cond:
+            depth = self._depth()
+            waits = {priority: list(values) for priority, values in self.waits.items()}
+            inflight = len(self.inflight)
+        wait_ms = {}
+        for priority, values in waits.items():
+            if values:
+                wait_ms[PRIORITY_NAMES[priority]] = {
+                    'mean': round(sum(values) / len(values) * 1000, 1),
+                    'p95': round(percentile(values, 0.95) * 1000, 1),
+                    'max': round(max(values) * 1000, 1),
+                }
+        return {
+            'queue_depth': depth,
+            'max_queue_depth': self.max_depth,
+            'in_flight': inflight,
+            'submitted': self.submitted,
+            'granted': self.granted,
+            'cancelled': self.cancelled,
+            'coalesced': self.coalesced,
+            'wait_ms': wait_ms,
+        }
+
+def get_scheduler(section):
+    # One scheduler per provider section of key.ini, sharing that provider's limiter
+    if section not in _schedulers:
+        with _schedulers_lock:
+            if section not in _schedulers:
+                _schedulers[section] = Scheduler(get_limiter(section), section.lower())
+    return _schedulers[section]
+
+def cancel_requests(group):
+    # A group's requests may be queued at several backends, e.g. after a fallback
+    return sum(scheduler.cancel(group) for scheduler in list(_schedulers.values()))
+
+def promote_requests(group, priority=INTERACTIVE):
+    return sum(scheduler.promote(group, priority) for scheduler in list(_schedulers.values()))
+
+def scheduler_stats():
+    return {section: scheduler.stats() for section, scheduler in _schedulers.items()}
@@ -0,0 +1,35 @@
+import configparser
+import os
+import threading
+
+# GARX_CONFIG points scripted runs at a config outside the working directory
+CONFIG_PATH = os.environ.get('GARX_CONFIG', 'key.ini')
+
+_config = None
+_config_lock = threading.Lock()
+
+def get_config():
+    global _config
+    if _config is None:
+        with _config_lock:
+            if _config is None:
+                # Only '=' separates keys from values: model names used as keys ([Models], [Pricing])
+                # may contain ':', e.g. Ollama's llama3.1:8b
+                config = configparser.ConfigParser(delimiters=('=',))
+                with open(CONFIG_PATH) as config_file:
+                    config.read_file(config_file)
+                _config = config
+    return _config
+
+def set_config_path(path):
+    # Must be called before the first get_config()
+    global CONFIG_PATH, _config
+    with _config_lock:
+        CONFIG_PATH = path
+        _config = None
+
+def get_setting(section, key, fallback=None, cast=str):
+    config = get_config()
+    if not config.has_option(section, key):
+        return fallback
+    return cast(config[section][key])
@@ -0,0 +1,96 @@
+import logging
+import re
+import threading
+from settings import get_setting
+
+# Chat formats add a few tokens per message for the role and separators
+MESSAGE_OVERHEAD = 4
+DEFAULT_CONTEXT_WINDOW = 8192
+
+_encoding = None
+_encoding_lock = threading.Lock()
+_encoding_loaded = False
+
+def get_encoding():
+    # tiktoken is optional; without it token counts fall back to a characters-per-token estimate
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded:
+        with _encoding_lock:
+            if not _encoding_loaded:
+                try:
+                    import tiktoken
+                    _encoding = tiktoken.get_encoding(get_setting('Models', 'TOKENIZER', 'cl100k_base'))
+                except Exception as e:
+                    logging.warning(f"tiktoken unavailable, estimating token counts: {e}")
+                _encoding_loaded = True
+    return _encoding
+
+def count_tokens(text):
+    encoding = get_encoding()
+    if encoding is None:
+        return len(text) // 4 + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+def count_message_tokens(messages):
+    return sum(count_tokens(message['content']) + MESSAGE_OVERHEAD for message in messages)
+
+def context_window(model):
+    # Per-model context sizes live in the [Models] section of key.ini
+    default = get_setting('Models', 'DEFAULT_CONTEXT_WINDOW', DEFAULT_CONTEXT_WINDOW, int)
+    return get_setting('Models', model, default, int)
+
+def truncate_to_tokens(text, max_tokens):
+    if max_tokens <= 0:
+        return ""
+    encoding = get_encoding()
+    if encoding is None:
+        return text[:max_tokens * 4]
+    tokens = encoding.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+    return encoding.decode(tokens[:max_tokens])
+
+def split_by_tokens(text, chunk_tokens):
+    # Packs whole paragraphs into chunks of at most chunk_tokens; oversized paragraphs are cut
+    chunks = []
+    current = []
+    current_tokens = 0
+    for paragraph in re.split(r"\n\s*\n", text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        tokens = count_tokens(paragraph)
+        while tokens > chunk_tokens:
+            head = truncate_to_tokens(paragraph, chunk_tokens)
+            if current:
+                chunks.append("\n\n".join(current))
+                current, current_tokens = [], 0
+            chunks.append(head)
+            paragraph = paragraph[len(head):].strip()
+            tokens = count_tokens(paragraph)
+        if current and current_tokens + tokens > chunk_tokens:
+            chunks.append("\n\n".join(current))
+            current, current_tokens = [], 0
+        if paragraph:
+            current.append(paragraph)
+            current_tokens += tokens
+    if current:
+        chunks.append("\n\n".join(current))
+    return chunks
+
+def fit_messages(messages, model, max_tokens):
+    # Keeps prompt + completion inside the model's context window by trimming the last message
+    # and, if that is not enough, lowering max_tokens. Returns the (messages, max_tokens) to send.
+    window = context_window(model)
+    prompt_tokens = count_message_tokens(messages)
+    if prompt_tokens + max_tokens <= window:
+        return messages, max_tokens
+    min_completion = min(max_tokens, get_setting('Models', 'MIN_COMPLETION_TOKENS', 256, int))
+    excess = prompt_tokens + min_completion - window
+    if excess > 0:
+        last = messages[-1]
+        keep = count_tokens(last['content']) - excess
+        logging.warning(f"Prompt of {prompt_tokens} tokens exceeds the {window} token context of {model}, truncating")
+        messages = messages[:-1] + [dict(last, content=truncate_to_tokens(last['content'], keep))]
+        prompt_tokens = count_message_tokens(messages)
+    return messages, max(min(max_tokens, window - prompt_tokens), 1)
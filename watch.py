@@ -0,0 +1,153 @@
+import logging
+import sqlite3
+import time
+import metrics
+from arxiv_feed import VERSION_RE
+from arxiv_utils import fetch_arxiv_papers, normalize_query, summarize_papers
+from library import get_library
+from settings import get_setting
+
+# Watches follow new submissions, or with lastUpdatedDate also new versions of older papers
+WATCH_SORTS = ('submittedDate', 'lastUpdatedDate')
+DATE_FIELDS = {'submittedDate': 'published_date', 'lastUpdatedDate': 'updated_date'}
+# A watch counts as due this many seconds early, so a timer or cron job running every INTERVAL_MINUTES
+# doesn't miss it because the previous poll finished a moment after it started
+DUE_SLACK = 60
+
+def add_watch(query, sort_by='submittedDate'):
+    if sort_by not in WATCH_SORTS:
+        raise ValueError(f"sort_by must be one of {WATCH_SORTS}")
+    return get_library().add_watch(normalize_query(query), sort_by)
+
+def find_watch(query, sort_by='submittedDate'):
+    return get_library().find_watch(normalize_query(query), sort_by)
+
+def watch_key(paper, sort_by):
+    # A new version is only news when watching updates
+    return paper['id'] if sort_by == 'lastUpdatedDate' else VERSION_RE.sub('', paper['id'])
+
+def watch_filters(watch):
+    filters = {'sort_by': watch['sort_by'], 'sort_order': 'descending'}
+    # Nothing submitted before the newest paper already seen can be new. arXiv dates are per day, so
+    # that day is fetched again and its papers are deduplicated by ID.
+    if watch['sort_by'] == 'submittedDate' and watch['last_seen']:
+        filters['date_from'] = watch['last_seen']
+    return filters
+
+def watch_pages(watch):
+    # (page size, pages): a first poll only takes one page as the baseline
+    page_size = get_setting('Watch', 'PAGE_SIZE', 50, int)
+    return page_size, get_setting('Watch', 'MAX_PAGES', 10, int) if watch['last_seen'] else 1
+
+def page_delta(watch, papers):
+    # Returns the papers not older than last_seen and whether the page reached older ones
+    if not watch['last_seen']:
+        return papers, False
+    field = DATE_FIELDS[watch['sort_by']]
+    fresh = [paper for paper in papers if (paper[field] or '') >= watch['last_seen']]
+    return fresh, len(fresh) < len(papers)
+
+def record_delta(watch, candidates, truncated=False):
+    # Keeps the papers the watch hasn't found before and moves last_seen forward
+    field = DATE_FIELDS[watch['sort_by']]
+    library = get_library()
+    baseline = not watch['last_seen']
+    added = set(library.add_watch_papers(watch['id'], [(watch_key(paper, watch['sort_by']), paper['id']) for paper in candidates],
+                                         seen=baseline))
+    papers = [paper for paper in candidates if paper['id'] in added]
+    dates = [paper[field] for paper in candidates if paper[field]]
+    if watch['last_seen']:
+        dates.append(watch['last_seen'])
+    library.update_watch(watch['id'], max(dates, default=None), time.time())
+    if truncated:
+        logging.warning(f"Watch {watch['query']!r} has more new papers than {get_setting('Watch', 'MAX_PAGES', 10, int)} pages; "
+                        "older ones were skipped")
+    if baseline:
+        logging.info(f"Watch {watch['query']!r}: recorded {len(papers)} existing papers as the baseline")
+        return []
+    metrics.inc('garx_watch_new_papers_total', len(papers))
+    logging.info(f"Watch {watch['query']!r}: {len(papers)} new papers")
+    return papers
+
+class WatchPoll:
+    # One delta fetch of a watch, shared by poll_watch and async_client.poll_watch_async, which only add the
+    # fetching: requests() gives the arguments for each page, add_page() takes the page back and finish()
+    # records what was found
+    def __init__(self, watch):
+        self.watch = watch
+        self.page_size, self.max_pages = watch_pages(watch)
+        self.candidates = []
+        self.complete = False
+
+    def requests(self):
+        for page in range(self.max_pages):
+            if self.complete:
+                return
+            # Never from the search cache, which would hide anything published within its TTL
+            yield dict(query=self.watch['query'], max_results=self.page_size, start=page * self.page_size, use_cache=False,
+                       **watch_filters(self.watch))
+
+    def add_page(self, papers):
+        fresh, reached_seen = page_delta(self.watch, papers)
+        self.candidates += fresh
+        self.complete = reached_seen or len(papers) < self.page_size
+
+    def finish(self):
+        # The new papers, or None if the library couldn't be updated
+        try:
+            return record_delta(self.watch, self.candidates, truncated=not self.complete and bool(self.watch['last_seen']))
+        except sqlite3.Error as e:
+            logging.error(f"Error updating watch in library: {e}")
+            return None
+
+def poll_watch(watch):
+    # New papers since the last poll, or None if arXiv couldn't be reached
+    poll = WatchPoll(watch)
+    for request in poll.requests():
+        papers = fetch_arxiv_papers(**request)
+        if papers is None:
+            return None
+        poll.add_page(papers)
+    return poll.finish()
+
+def due_watches(force=False):
+    interval = get_setting('Watch', 'INTERVAL_MINUTES', 60, float) * 60 - DUE_SLACK
+    now = time.time()
+    try:
+        watches = get_library().watches()
+    except sqlite3.Error as e:
+        logging.error(f"Error reading watches from library: {e}")
+        return []
+    return [watch for watch in watches
+            if force or watch['last_checked'] is None or now - watch['last_checked'] >= interval]
+
+def unique_papers(found):
+    # The same paper can turn up in several watches
+    papers = {}
+    for watch_papers in found.values():
+        for paper in watch_papers:
+            papers.setdefault(paper['id'], paper)
+    return list(papers.values())
+
+def add_found(found, watch, papers, on_new=None):
+    if papers:
+        found[watch['id']] = papers
+        if on_new is not None:
+            on_new(watch, papers)
+
+def papers_to_summarize(found, summarize=None):
+    # What a poll found, once per paper, unless summarizing is off (AUTO_SUMMARIZE by default)
+    if summarize is None:
+        summarize = get_setting('Watch', 'AUTO_SUMMARIZE', 1, int) > 0
+    return unique_papers(found) if summarize else []
+
+def poll_watches(watches=None, force=False, summarize=None, on_new=None):
+    # Polls the watches that are due and queues summaries of what they found; returns {watch ID: new papers}
+    found = {}
+    for watch in watches if watches is not None else due_watches(force):
+        add_found(found, watch, poll_watch(watch), on_new)
+    papers = papers_to_summarize(found, summarize)
+    if papers:
+        # Behind anything the user asks for; the summaries land in the library
+        summarize_papers(papers, group='watch')
+    return found